@@ -7,6 +7,43 @@ from datetime import datetime
 st.set_page_config(page_title="Mini-AES Encryption/Decryption", layout="wide")
 st.title("Mini-AES Encryption/Decryption")
 
+# Process log lines shown per page
+LOG_PAGE_LINES = 200
+
+# Streamlit reruns this script on every interaction, so ciphers (key schedule
+# and codebooks) are kept in a resource cache shared by all sessions, and
+# results and process logs are memoized per (mode, cipher mode, input, key, IV).
+CIPHER_CACHE_ENTRIES = 64
+RESULT_CACHE_ENTRIES = 256
+
+@st.cache_resource(max_entries=CIPHER_CACHE_ENTRIES)
+def get_cipher(key):
+    return mini_aes.MiniAES(key, "codebook")
+
+@st.cache_data(max_entries=RESULT_CACHE_ENTRIES)
+def run_operation(mode, cipher_mode, input_text, key, iv):
+    """(result, error) of an operation, without the process log."""
+    try:
+        cipher = get_cipher(key)
+        if cipher_mode == "ECB":
+            result = cipher.encrypt_ecb(input_text) if mode == "Encrypt" else cipher.decrypt_ecb(input_text)
+        else:
+            result = cipher.encrypt_cbc(input_text, iv) if mode == "Encrypt" else cipher.decrypt_cbc(input_text)
+        return result, None
+    except ValueError as e:
+        return None, str(e)
+
+@st.cache_data(max_entries=RESULT_CACHE_ENTRIES)
+def trace_operation(mode, cipher_mode, input_text, key, iv):
+    """(result, error, log) of the traced operation; the log is an ExecutionTrace."""
+    if cipher_mode == "ECB":
+        if mode == "Encrypt":
+            return mini_aes.encrypt(input_text, key, trace=True)
+        return mini_aes.decrypt(input_text, key, trace=True)
+    if mode == "Encrypt":
+        return mini_aes.encrypt_cbc(input_text, key, iv, trace=True)
+    return mini_aes.decrypt_cbc(input_text, key, trace=True)
+
 # --- DEFINE TEST CASES ---
 TEST_CASES = [
     {
@@ -117,39 +154,25 @@ if st.button("Process"):
             if cipher_mode == "CBC" and iv_text:
                 int(iv_text, 16)
             
-            if cipher_mode == "ECB":
-                if mode == "Encrypt": 
-                    result, error, log = mini_aes.encrypt(input_text, key_text)
-                else:
-                    result, error, log = mini_aes.decrypt(input_text, key_text)
-            else:  
-                if mode == "Encrypt":
-                    result, error, log = mini_aes.encrypt_cbc(input_text, key_text, iv_text if iv_text else None)
-                else:
-                    result, error, log = mini_aes.decrypt_cbc(input_text, key_text)
+            # a random IV is drawn here, outside the caches, so it is fresh on every click
+            iv = None
+            if cipher_mode == "CBC":
+                iv = iv_text if iv_text or mode == "Decrypt" else mini_aes.generate_iv()
+            operation = {
+                'mode': mode,
+                'cipher_mode': cipher_mode,
+                'input_text': input_text,
+                'key': key_text,
+                'iv': iv
+            }
+            result, error = run_operation(**operation)
 
             if error:
                 st.error(f"Error: {error}")
             elif result:
-                st.success(f"Operation ({mode} in {cipher_mode} mode) successful!")
-                st.subheader("Result")
-                st.code(result, language="text")
-                
-                # Display detailed log in an expander
-                with st.expander("Show detailed process log"):
-                    for line in log:
-                        st.text(line)
-                
-                # Store result and log in session state for export
+                # Store the operation; the result and its log are shown below on every rerun
                 st.session_state.last_result = result
-                st.session_state.last_log = log
-                st.session_state.last_operation = {
-                    'mode': mode,
-                    'cipher_mode': cipher_mode,
-                    'input_text': input_text,
-                    'key': key_text,
-                    'iv': iv_text if cipher_mode == "CBC" else None
-                }
+                st.session_state.last_operation = operation
 
         except ValueError:
             error = "Input values must contain valid hexadecimal characters (0-9, A-F)."
@@ -160,6 +183,23 @@ if st.button("Process"):
     
     if error:
         st.error(error)
+        st.session_state.pop('last_result', None)
+
+# Result of the last operation
+if 'last_result' in st.session_state:
+    last_operation = st.session_state.last_operation
+    st.success(f"Operation ({last_operation['mode']} in {last_operation['cipher_mode']} mode) successful!")
+    st.subheader("Result")
+    st.code(st.session_state.last_result, language="text")
+    
+    # Display the detailed log one page at a time. Streamlit runs the body of an
+    # expander even when it is collapsed, so a toggle keeps the traced call lazy
+    if st.toggle("Show detailed process log", key="show_process_log"):
+        log = trace_operation(**last_operation)[2]
+        first_line = st.number_input(f"First log line (of {len(log)})", min_value=0, value=0,
+                                     step=LOG_PAGE_LINES, key="process_log_first_line")
+        for line in log.lines(first_line, first_line + LOG_PAGE_LINES):
+            st.text(line)
 
 # Import/Export
 st.markdown("---")
@@ -168,42 +208,50 @@ st.subheader("Import/Export Operations")
 imp_exp_tabs = st.tabs(["Export", "Import"])
 
 with imp_exp_tabs[0]:  # Export tab
-    st.write("Export operation to CSV")
+    st.write("Export operation to CSV or to a binary trace file")
     custom_filename = st.text_input("Custom filename (optional)", 
                                   placeholder="Leave empty for auto-generated name")
+    export_format = st.radio("Format", ["CSV", "Binary trace"], horizontal=True)
+    compress_export = export_format == "CSV" and st.checkbox("Compress (gzip)", value=False)
     
-    if st.button("Export to CSV"):
+    if st.button(f"Export to {export_format}"):
         if 'last_result' not in st.session_state:
             st.warning("Please perform an operation first before exporting.")
         else:
             try:
                 filename = custom_filename if custom_filename else None
-                export_path = mini_aes.export_to_csv(
+                export_details = dict(
                     mode=st.session_state.last_operation['mode'],
                     cipher_mode=st.session_state.last_operation['cipher_mode'],
                     input_text=st.session_state.last_operation['input_text'],
                     key=st.session_state.last_operation['key'],
                     iv=st.session_state.last_operation['iv'],
                     output=st.session_state.last_result,
-                    log=st.session_state.last_log,
+                    log=trace_operation(**st.session_state.last_operation)[2],
                     filename=filename
                 )
+                if export_format == "CSV":
+                    export_path = mini_aes.export_to_csv(**export_details, compress=compress_export)
+                    mime = "application/gzip" if compress_export else "text/csv"
+                else:
+                    export_path = mini_aes.export_to_binary(**export_details)
+                    mime = "application/octet-stream"
                 st.success(f"Operation details exported to: {export_path}")
                 
                 # Provide download button for the exported file
                 with open(export_path, 'rb') as f:
                     st.download_button(
-                        label="Download CSV",
+                        label=f"Download {export_format}",
                         data=f,
                         file_name=os.path.basename(export_path),
-                        mime="text/csv"
+                        mime=mime
                     )
             except Exception as e:
-                st.error(f"Could not export to CSV: {str(e)}")
+                st.error(f"Could not export to {export_format}: {str(e)}")
 
 with imp_exp_tabs[1]:  # Import tab
-    st.write("Import operation from CSV")
-    uploaded_file = st.file_uploader("Choose a CSV file", type=['csv'])
+    st.write("Import operation from CSV or a binary trace file")
+    uploaded_file = st.file_uploader("Choose a CSV or trace file", type=['csv', 'gz', 'trace'])
     if uploaded_file is not None:
         try:
             # Save the uploaded file temporarily
@@ -214,7 +262,10 @@ with imp_exp_tabs[1]:  # Import tab
                 f.write(uploaded_file.getvalue())
             
             # Import the operation details
-            operation = mini_aes.import_from_csv(temp_path)
+            if uploaded_file.name.endswith(".trace"):
+                operation = mini_aes.import_from_binary(temp_path)
+            else:
+                operation = mini_aes.import_from_csv(temp_path)
             if isinstance(operation, tuple):  # Error occurred
                 st.error(f"Error importing file: {operation[1]}")
             else:
@@ -222,11 +273,23 @@ with imp_exp_tabs[1]:  # Import tab
                 st.success("Successfully imported operation details!")
                 with st.expander("View imported details"):
                     for key, value in operation.items():
+                        if key == 'Trace File':
+                            continue
                         if key != 'Process Log':
                             st.write(f"{key}: {value}")
+                        elif isinstance(value, mini_aes.ExecutionTrace):
+                            # binary trace: read just the selected block from the mapped file
+                            st.write(f"Process Log ({value.block_count} blocks):")
+                            if value.block_count:
+                                block = st.number_input("Block", min_value=1, max_value=value.block_count, value=1)
+                                for line in value.blocks(block - 1, block):
+                                    st.text(line)
                         else:
+                            # the log is read lazily; only the selected page is loaded
                             st.write("Process Log:")
-                            for line in value:
+                            first_line = st.number_input("First log line", min_value=0, value=0,
+                                                         step=LOG_PAGE_LINES, key="import_log_first_line")
+                            for line in value.lines(first_line, first_line + LOG_PAGE_LINES):
                                 st.text(line)
                 
                 # Add button to apply imported values
@@ -237,7 +300,9 @@ with imp_exp_tabs[1]:  # Import tab
                         st.session_state.iv_text = operation['IV']
                     st.rerun()
             
-            # Clean up temp file
+            # Clean up temp file; a binary trace must be unmapped first
+            if isinstance(operation, dict) and 'Trace File' in operation:
+                operation['Trace File'].close()
             os.remove(temp_path)
             
         except Exception as e:
@@ -1,5 +1,18 @@
 import random
+import collections
+import copy
 import csv
+import functools
+import gzip
+import hmac
+import importlib
+import itertools
+import json
+import mmap
+import struct
+import sys
+import threading
+from array import array
 from datetime import datetime
 import os
 
@@ -46,13 +59,19 @@ INV_MIX_COL_MATRIX = [
 ]
 
 # helper conversion functions
-def hex_to_nibbles(hex_string):
+_HEX_DIGITS = frozenset("0123456789abcdefABCDEF")
+
+def hex_to_int(hex_string):
+    # exactly 4 hex digits: int(x, 16) alone would also take " 123", "+123" or "0x12",
+    # which the bytes-based fast path (hex_to_bytes) rejects
     if not isinstance(hex_string, str) or len(hex_string) != 4:
         raise ValueError("Input hex string must be 4 characters long")
-    try:
-        val = int(hex_string, 16)
-    except ValueError:
+    if not _HEX_DIGITS.issuperset(hex_string):
         raise ValueError("Input must be a valid hexadecimal string")
+    return int(hex_string, 16)
+
+def hex_to_nibbles(hex_string):
+    val = hex_to_int(hex_string)
     nibbles = [(val >> 12) & 0xF, (val >> 8) & 0xF, (val >> 4) & 0xF, val & 0xF]
     return nibbles
 
@@ -200,245 +219,1519 @@ def key_expansion(key_nibbles):
     log.append("--- End Key Expansion ---")
     return round_keys, log
 
-def encrypt(plaintext_hex, key_hex):
+# packed 16-bit fast path (no tracing)
+# A block is packed as the integer N0N1N2N3, so column 0 of the state matrix
+# is the high byte and column 1 is the low byte.
+_S_BOX_LIST = [S_BOX[n] for n in range(16)]
+_INV_S_BOX_LIST = [INV_S_BOX[n] for n in range(16)]
+_GF_MUL = [[gf_multiply(a, b) for b in range(16)] for a in range(16)]
+
+def _sub_nibbles_packed(state, sbox):
+    return ((sbox[state >> 12] << 12) | (sbox[(state >> 8) & 0xF] << 8)
+            | (sbox[(state >> 4) & 0xF] << 4) | sbox[state & 0xF])
+
+def _shift_rows_packed(state):
+    # swaps N1 and N3 (the second row of the state matrix)
+    return (state & 0xF0F0) | ((state >> 8) & 0x000F) | ((state & 0x000F) << 8)
+
+def _mix_columns_packed(state, mix_matrix):
+    m00, m01 = _GF_MUL[mix_matrix[0][0]], _GF_MUL[mix_matrix[0][1]]
+    m10, m11 = _GF_MUL[mix_matrix[1][0]], _GF_MUL[mix_matrix[1][1]]
+    n0, n1 = state >> 12, (state >> 8) & 0xF
+    n2, n3 = (state >> 4) & 0xF, state & 0xF
+    return (((m00[n0] ^ m01[n1]) << 12) | ((m10[n0] ^ m11[n1]) << 8)
+            | ((m00[n2] ^ m01[n3]) << 4) | (m10[n2] ^ m11[n3]))
+
+def expand_key_packed(key):
     """
-    Encrypt using ECB mode.
-    plaintext_hex must be a multiple of 4 hex characters (16-bit blocks)
+    Key expansion without logging.
+    key is the 16-bit key as an int; returns the round keys RK0..RK3 packed the same way as blocks.
     """
-    log = []
-    log.append("--- ECB Mode Encryption ---")
-    
+    w = [key >> 8, key & 0xFF]
+    for i in range(2, 2 * (NUM_ROUNDS + 1)):
+        temp = w[i-1]
+        if i % 2 == 0: # G function: RotWord, SubWord, XOR RCON
+            rcon = RCON[i // 2]
+            temp = ((_S_BOX_LIST[temp & 0xF] << 4) | _S_BOX_LIST[temp >> 4]) ^ ((rcon[0] << 4) | rcon[1])
+        w.append(w[i-2] ^ temp)
+    return tuple((w[i] << 8) | w[i+1] for i in range(0, len(w), 2))
+
+def encrypt_block_packed(block, round_keys):
+    state = block ^ round_keys[0]
+    for r in range(1, NUM_ROUNDS):
+        state = _sub_nibbles_packed(state, _S_BOX_LIST)
+        state = _shift_rows_packed(state)
+        state = _mix_columns_packed(state, MIX_COL_MATRIX)
+        state ^= round_keys[r]
+    state = _shift_rows_packed(_sub_nibbles_packed(state, _S_BOX_LIST))
+    return state ^ round_keys[NUM_ROUNDS]
+
+def decrypt_block_packed(block, round_keys):
+    state = block ^ round_keys[NUM_ROUNDS]
+    state = _sub_nibbles_packed(_shift_rows_packed(state), _INV_S_BOX_LIST)
+    state ^= round_keys[NUM_ROUNDS-1]
+    for r in range(NUM_ROUNDS-2, -1, -1):
+        state = _mix_columns_packed(state, INV_MIX_COL_MATRIX)
+        state = _shift_rows_packed(state)
+        state = _sub_nibbles_packed(state, _INV_S_BOX_LIST)
+        state ^= round_keys[r]
+    return state
+
+# Key schedules are cached per key so services that rotate among many keys
+# don't re-expand a key on every request.
+KEY_SCHEDULE_CACHE_SIZE = 4096
+
+get_key_schedule = functools.lru_cache(maxsize=KEY_SCHEDULE_CACHE_SIZE)(expand_key_packed)
+
+def set_key_schedule_cache_size(maxsize):
+    """Replace the key schedule cache with an empty one holding at most maxsize keys."""
+    global get_key_schedule
+    get_key_schedule = functools.lru_cache(maxsize=maxsize)(expand_key_packed)
+
+# binary block codec
+# Blocks travel as big-endian byte pairs. Engines work on array('H') of packed
+# block values, so loading a buffer is one frombytes() plus a byteswap on
+# little-endian machines, and storing is the reverse straight into the output buffer.
+_NATIVE_LITTLE_ENDIAN = sys.byteorder == "little"
+
+def blocks_from_buffer(data):
+    """bytes/bytearray/memoryview of big-endian 16-bit blocks -> array('H') of packed blocks."""
+    view = memoryview(data).cast('B')
+    if len(view) % 2 != 0:
+        raise ValueError("Data length must be a multiple of 2 bytes (16-bit blocks)")
+    blocks = array('H')
+    blocks.frombytes(view)
+    if _NATIVE_LITTLE_ENDIAN:
+        blocks.byteswap()
+    return blocks
+
+def output_buffer(out, size):
+    """
+    (out, byte view of out) for writing size bytes: out is any writable buffer,
+    or None for a new bytearray. Raises TypeError/ValueError if it is read-only or too small.
+    """
+    if out is None:
+        out = bytearray(size)
+    view = memoryview(out).cast('B')
+    if view.readonly:
+        raise TypeError("Output buffer must be writable")
+    if len(view) < size:
+        raise ValueError(f"Output buffer too small: need {size} bytes, got {len(view)}")
+    return out, view
+
+def blocks_to_buffer(blocks, out=None, offset=0):
+    """
+    Write packed blocks as big-endian bytes into out (a writable buffer) at the
+    given byte offset; allocates a bytearray when out is None. blocks is
+    byte-swapped in place on little-endian machines, so pass a scratch array.
+    """
+    if _NATIVE_LITTLE_ENDIAN:
+        blocks.byteswap()
+    size = 2 * len(blocks)
+    out, view = output_buffer(out, offset + size)
+    view[offset:offset + size] = memoryview(blocks).cast('B')
+    return out
+
+def hex_to_bytes(text_hex):
+    """Hex text -> bytes; raises ValueError on anything hex_to_int() would reject (such as whitespace)."""
+    # one bytes.fromhex pass over the whole input; fromhex skips whitespace, so
+    # the length check keeps the rules of hex_to_int
+    try:
+        data = bytes.fromhex(text_hex)
+    except (ValueError, TypeError):
+        data = None
+    if data is None or 2 * len(data) != len(text_hex):
+        raise ValueError("Input must be a valid hexadecimal string")
+    return data
+
+def blocks_to_hex(blocks):
+    """array('H') of packed blocks -> upper-case hex text. blocks is byte-swapped in place, so pass a scratch array."""
+    if _NATIVE_LITTLE_ENDIAN:
+        blocks.byteswap()
+    return blocks.tobytes().hex().upper()
+
+# Default chunk size for streaming (bytes)
+STREAM_CHUNK_SIZE = 1 << 20
+
+def _iter_stream_chunks(src, chunk_size, use_mmap=False):
+    # Yields chunks of a binary stream. The readinto buffer is reused, so each
+    # chunk must be consumed before the next one is requested.
+    if use_mmap:
+        size = os.fstat(src.fileno()).st_size
+        if size:
+            with mmap.mmap(src.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                for start in range(0, size, chunk_size):
+                    yield mapped[start:start + chunk_size]
+        return
+    view = memoryview(bytearray(chunk_size))
+    while True:
+        count = src.readinto(view)
+        if not count:
+            break
+        yield view[:count]
+
+def _xor_bytes(src, keystream, out=None):
+    # XOR a byte buffer with (the start of) a keystream as two big ints
+    size = len(src)
+    mixed = int.from_bytes(src, "big") ^ int.from_bytes(memoryview(keystream)[:size], "big")
+    out, dst = output_buffer(out, size)
+    dst[:size] = mixed.to_bytes(size, "big")
+    return out
+
+def _xor_block_arrays(blocks, keystream):
+    # same for two equally long array('H'), in native byte order
+    mixed = int.from_bytes(blocks, "little") ^ int.from_bytes(keystream, "little")
+    return array('H', mixed.to_bytes(2 * len(blocks), "little"))
+
+def _crypt_ofb_cycle(src, cycle, start_block, out=None):
+    # XOR src with the OFB keystream cycle, starting at block start_block
+    offset = (2 * start_block) % len(cycle)
+    if offset:
+        cycle = cycle[offset:] + cycle[:offset]
+    repeats = -(-len(src) // len(cycle))
+    return _xor_bytes(src, cycle * repeats if repeats > 1 else cycle, out)
+
+def _with_iv_prefix(data, iv, out, crypt_body):
+    # writes the 2-byte IV (random when None), then crypt_body(data, iv, 0, rest_of_out)
+    if iv is None:
+        iv = int(generate_iv(), 16)
+    size = len(memoryview(data).cast('B'))
+    out, dst = output_buffer(out, 2 + size)
+    dst[0:2] = iv.to_bytes(2, "big")
+    crypt_body(data, iv, 0, dst[2:2 + size])
+    return out
+
+def _split_iv_prefix(data):
+    src = memoryview(data).cast('B')
+    if len(src) < 2:
+        raise ValueError("Ciphertext too short. Need at least the IV (2 bytes)")
+    return src[2:], int.from_bytes(src[0:2], "big")
+
+def _counter_blocks(start, count):
+    # CTR counter blocks start, start+1, ... wrapping at 2^16
+    counters = array('H')
+    while len(counters) < count:
+        stop = min(0x10000, start + count - len(counters))
+        counters.extend(range(start, stop))
+        start = 0
+    return counters
+
+# block engines
+# An engine is built from one key schedule and processes packed 16-bit blocks.
+# encrypt_blocks/decrypt_blocks take any sequence of blocks and return an array('H');
+# engines override whichever of the methods below they can do faster.
+class PackedEngine:
+    """Round-by-round engine on packed ints (no precomputation beyond the key schedule)."""
+    name = "packed"
+
+    def __init__(self, round_keys):
+        self.round_keys = round_keys
+
+    def encrypt_block(self, block):
+        return encrypt_block_packed(block, self.round_keys)
+
+    def decrypt_block(self, block):
+        return decrypt_block_packed(block, self.round_keys)
+
+    def encrypt_blocks(self, blocks):
+        return array('H', map(self.encrypt_block, blocks))
+
+    def decrypt_blocks(self, blocks):
+        return array('H', map(self.decrypt_block, blocks))
+
+    def encrypt_cbc_blocks(self, blocks, iv):
+        encrypt_block = self.encrypt_block
+        out = array('H', blocks)
+        previous_block = iv
+        for i, block in enumerate(out):
+            previous_block = out[i] = encrypt_block(block ^ previous_block)
+        return out
+
+    def decrypt_cbc_blocks(self, blocks, iv):
+        # every block only needs the previous ciphertext block, so decrypt them all first
+        out = self.decrypt_blocks(blocks)
+        previous_block = iv
+        for i, block in enumerate(blocks):
+            out[i] ^= previous_block
+            previous_block = block
+        return out
+
+@functools.lru_cache(maxsize=None)
+def _codebook_column_tables():
+    # 256-entry byte tables for the column-local steps, taken from the reference
+    # sub_nibbles/mix_columns functions. Both columns of the matrix get the same
+    # byte so column 0 of the result is the transformed column.
+    def column_table(step):
+        table = bytearray(256)
+        for col in range(256):
+            out = step([[col >> 4, col >> 4], [col & 0xF, col & 0xF]])
+            table[col] = (out[0][0] << 4) | out[1][0]
+        return bytes(table)
+    return (column_table(lambda m: sub_nibbles(m, S_BOX)),
+            column_table(lambda m: sub_nibbles(m, INV_S_BOX)),
+            column_table(lambda m: mix_columns(m, MIX_COL_MATRIX)),
+            column_table(lambda m: mix_columns(m, INV_MIX_COL_MATRIX)))
+
+def _build_codebooks(round_keys):
+    # Runs the round pipeline over all 65536 blocks at once. The blocks are kept
+    # as one big-endian byte string (one column per byte): SubNibbles and
+    # MixColumns are bytes.translate calls, ShiftRows and AddRoundKey are big-int
+    # mask/XOR operations.
+    sub, inv_sub, mix, inv_mix = _codebook_column_tables()
+    size = 2 * 0x10000
+    row1_n1 = int.from_bytes(b"\x0F\x00" * 0x10000, "big")
+    row1_n3 = int.from_bytes(b"\x00\x0F" * 0x10000, "big")
+    row0 = int.from_bytes(b"\xF0\xF0" * 0x10000, "big")
+
+    def add_round_key(data, round_key):
+        key_stream = int.from_bytes(round_key.to_bytes(2, "big") * 0x10000, "big")
+        return (int.from_bytes(data, "big") ^ key_stream).to_bytes(size, "big")
+
+    def shift_rows(data):
+        x = int.from_bytes(data, "big")
+        return ((x & row0) | ((x & row1_n1) >> 8) | ((x & row1_n3) << 8)).to_bytes(size, "big")
+
+    def to_array(data):
+        out = array('H', data)
+        if sys.byteorder == "little":
+            out.byteswap()
+        return out
+
+    identity = array('H', range(0x10000))
+    if sys.byteorder == "little":
+        identity.byteswap()
+    identity = identity.tobytes()
+
+    data = add_round_key(identity, round_keys[0])
+    for r in range(1, NUM_ROUNDS):
+        data = shift_rows(data.translate(sub)).translate(mix)
+        data = add_round_key(data, round_keys[r])
+    data = add_round_key(shift_rows(data.translate(sub)), round_keys[NUM_ROUNDS])
+    forward = to_array(data)
+
+    data = add_round_key(identity, round_keys[NUM_ROUNDS])
+    data = add_round_key(shift_rows(data).translate(inv_sub), round_keys[NUM_ROUNDS-1])
+    for r in range(NUM_ROUNDS-2, -1, -1):
+        data = shift_rows(data.translate(inv_mix)).translate(inv_sub)
+        data = add_round_key(data, round_keys[r])
+    inverse = to_array(data)
+    return forward, inverse
+
+# Codebooks are 2 x 128 KiB per key, so only the most recently used keys are kept.
+CODEBOOK_CACHE_SIZE = 16
+
+get_codebooks = functools.lru_cache(maxsize=CODEBOOK_CACHE_SIZE)(_build_codebooks)
+
+def set_codebook_cache_size(maxsize):
+    """Replace the codebook cache with an empty one holding at most maxsize keys."""
+    global get_codebooks
+    get_codebooks = functools.lru_cache(maxsize=maxsize)(_build_codebooks)
+
+def _ofb_cycle(forward, iv):
+    # E is a permutation, so the orbit of iv is a cycle that ends with iv itself:
+    # E(iv), E(E(iv)), ..., iv. The OFB keystream is that cycle repeated.
+    cycle = array('H')
+    block = forward[iv]
+    cycle.append(block)
+    while block != iv:
+        block = forward[block]
+        cycle.append(block)
+    if _NATIVE_LITTLE_ENDIAN:
+        cycle.byteswap()
+    return cycle.tobytes()
+
+def _build_ofb_cycle(round_keys, iv):
+    if isinstance(round_keys[0], tuple):
+        # (inner, outer) schedules of DoubleMiniAES: compose the two codebooks
+        first, second = (get_codebooks(keys)[0] for keys in round_keys)
+        return _ofb_cycle(array('H', map(second.__getitem__, first)), iv)
+    return _ofb_cycle(get_codebooks(round_keys)[0], iv)
+
+_CacheInfo = collections.namedtuple("CacheInfo", ["hits", "misses", "maxsize", "currsize"])
+
+class _OFBCycleCache:
+    # functools.lru_cache over _build_ofb_cycle, plus lookup() for short messages,
+    # which only want a cycle that is already cached or evidently reused
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._cycles = collections.OrderedDict()
+        # (round_keys, iv) pairs lookup() missed; a second miss builds the cycle
+        self._requested = collections.OrderedDict()
+        self._hits = self._misses = 0
+        self._lock = threading.Lock()
+
+    def _remember(self, entries, key, value):
+        entries[key] = value
+        entries.move_to_end(key)
+        if self.maxsize is not None and len(entries) > self.maxsize:
+            entries.popitem(last=False)
+
+    def _cached(self, key):
+        with self._lock:
+            cycle = self._cycles.get(key)
+            if cycle is not None:
+                self._cycles.move_to_end(key)
+                self._hits += 1
+            return cycle
+
+    def __call__(self, round_keys, iv):
+        key = (round_keys, iv)
+        cycle = self._cached(key)
+        if cycle is None:
+            cycle = _build_ofb_cycle(round_keys, iv)
+            with self._lock:
+                self._misses += 1
+                self._requested.pop(key, None)
+                if self.maxsize != 0:
+                    self._remember(self._cycles, key, cycle)
+        return cycle
+
+    def lookup(self, round_keys, iv):
+        """The cached cycle for (round_keys, iv), built only if this pair was looked up before; else None."""
+        if self.maxsize == 0:
+            return None
+        key = (round_keys, iv)
+        cycle = self._cached(key)
+        if cycle is None:
+            with self._lock:
+                repeated = key in self._requested
+                if not repeated:
+                    self._remember(self._requested, key, True)
+            if repeated:
+                cycle = self(round_keys, iv)
+        return cycle
+
+    def cache_info(self):
+        return _CacheInfo(self._hits, self._misses, self.maxsize, len(self._cycles))
+
+    def cache_clear(self):
+        with self._lock:
+            self._cycles.clear()
+            self._requested.clear()
+            self._hits = self._misses = 0
+
+# OFB keystream cycles (up to 128 KiB each) per (key schedule, IV); a DoubleMiniAES
+# schedule is the pair of its inner and outer schedules
+OFB_CYCLE_CACHE_SIZE = 64
+
+get_ofb_cycle = _OFBCycleCache(OFB_CYCLE_CACHE_SIZE)
+
+# messages ending within this many blocks use a cached cycle when there is one and
+# otherwise get their keystream computed directly: building a cycle walks up to
+# 65536 blocks, too much for a short message under a fresh IV. A (key, IV) pair
+# that comes up again gets its cycle built and cached.
+OFB_DIRECT_BLOCKS = 1 << 10
+
+def set_ofb_cycle_cache_size(maxsize):
+    """Replace the OFB keystream cycle cache with an empty one holding at most maxsize cycles."""
+    global get_ofb_cycle
+    get_ofb_cycle = _OFBCycleCache(maxsize)
+
+class CodebookEngine(PackedEngine):
+    """
+    Full-codebook engine: the cipher for one key is a permutation of the 65536
+    blocks, so after building the forward and inverse tables every block is a
+    single array lookup.
+    """
+    name = "codebook"
+
+    def __init__(self, round_keys):
+        super().__init__(round_keys)
+        self.forward, self.inverse = get_codebooks(round_keys)
+
+    def encrypt_block(self, block):
+        return self.forward[block]
+
+    def decrypt_block(self, block):
+        return self.inverse[block]
+
+    def encrypt_blocks(self, blocks):
+        return array('H', map(self.forward.__getitem__, blocks))
+
+    def decrypt_blocks(self, blocks):
+        return array('H', map(self.inverse.__getitem__, blocks))
+
+    def encrypt_cbc_blocks(self, blocks, iv):
+        forward = self.forward
+        out = array('H', blocks)
+        previous_block = iv
+        for i, block in enumerate(out):
+            previous_block = out[i] = forward[block ^ previous_block]
+        return out
+
+@functools.lru_cache(maxsize=None)
+def get_t_tables():
+    """
+    256-entry T-tables, built on first use. Each round without its key splits into
+    a part that depends only on the high byte (column 0) and a part that depends
+    only on the low byte (column 1), and the two parts are XORed.
+    Returns (enc_round, enc_final, dec_round, dec_first), each a pair of tables
+    for the high and low byte.
+    """
+    def sub_column(col, sbox):
+        return (sbox[col >> 4] << 4) | sbox[col & 0xF]
+
+    def inv_round_part(col, shift):
+        # InvMixColumns is linear, and after InvShiftRows the nibbles coming from
+        # each column land in different positions, so InvSubNibbles can be
+        # applied to just those positions.
+        state = _shift_rows_packed(_mix_columns_packed(col << shift, INV_MIX_COL_MATRIX))
+        return _sub_nibbles_packed(state, _INV_S_BOX_LIST) & _shift_rows_packed(0xFF << shift)
+
+    def inv_first_part(col, shift):
+        state = _shift_rows_packed(col << shift)
+        return _sub_nibbles_packed(state, _INV_S_BOX_LIST) & _shift_rows_packed(0xFF << shift)
+
+    enc_round = (
+        tuple(_mix_columns_packed(_shift_rows_packed(sub_column(col, _S_BOX_LIST) << 8), MIX_COL_MATRIX) for col in range(256)),
+        tuple(_mix_columns_packed(_shift_rows_packed(sub_column(col, _S_BOX_LIST)), MIX_COL_MATRIX) for col in range(256)),
+    )
+    enc_final = (
+        tuple(_shift_rows_packed(sub_column(col, _S_BOX_LIST) << 8) for col in range(256)),
+        tuple(_shift_rows_packed(sub_column(col, _S_BOX_LIST)) for col in range(256)),
+    )
+    dec_round = (
+        tuple(inv_round_part(col, 8) for col in range(256)),
+        tuple(inv_round_part(col, 0) for col in range(256)),
+    )
+    dec_first = (
+        tuple(inv_first_part(col, 8) for col in range(256)),
+        tuple(inv_first_part(col, 0) for col in range(256)),
+    )
+    return enc_round, enc_final, dec_round, dec_first
+
+class TTableEngine(PackedEngine):
+    """
+    T-table engine: SubNibbles, ShiftRows and MixColumns of a round are fused into
+    two table lookups on the packed state, followed by the round key XOR.
+    """
+    name = "ttable"
+
+    def __init__(self, round_keys):
+        super().__init__(round_keys)
+        (self.t_round, self.t_final, self.t_inv_round, self.t_inv_first) = get_t_tables()
+
+    def encrypt_block(self, block):
+        (t0, t1), (f0, f1) = self.t_round, self.t_final
+        round_keys = self.round_keys
+        state = block ^ round_keys[0]
+        for round_key in round_keys[1:NUM_ROUNDS]:
+            state = t0[state >> 8] ^ t1[state & 0xFF] ^ round_key
+        return f0[state >> 8] ^ f1[state & 0xFF] ^ round_keys[NUM_ROUNDS]
+
+    def decrypt_block(self, block):
+        (t0, t1), (f0, f1) = self.t_inv_round, self.t_inv_first
+        round_keys = self.round_keys
+        state = block ^ round_keys[NUM_ROUNDS]
+        state = f0[state >> 8] ^ f1[state & 0xFF] ^ round_keys[NUM_ROUNDS-1]
+        for round_key in round_keys[NUM_ROUNDS-2::-1]:
+            state = t0[state >> 8] ^ t1[state & 0xFF] ^ round_key
+        return state
+
+    def encrypt_blocks(self, blocks):
+        (t0, t1), (f0, f1) = self.t_round, self.t_final
+        first_key, middle_keys, last_key = self.round_keys[0], self.round_keys[1:NUM_ROUNDS], self.round_keys[NUM_ROUNDS]
+        out = array('H', blocks)
+        for i, state in enumerate(out):
+            state ^= first_key
+            for round_key in middle_keys:
+                state = t0[state >> 8] ^ t1[state & 0xFF] ^ round_key
+            out[i] = f0[state >> 8] ^ f1[state & 0xFF] ^ last_key
+        return out
+
+    def decrypt_blocks(self, blocks):
+        (t0, t1), (f0, f1) = self.t_inv_round, self.t_inv_first
+        round_keys = self.round_keys
+        first_key, second_key, middle_keys = round_keys[NUM_ROUNDS], round_keys[NUM_ROUNDS-1], round_keys[NUM_ROUNDS-2::-1]
+        out = array('H', blocks)
+        for i, state in enumerate(out):
+            state ^= first_key
+            state = f0[state >> 8] ^ f1[state & 0xFF] ^ second_key
+            for round_key in middle_keys:
+                state = t0[state >> 8] ^ t1[state & 0xFF] ^ round_key
+            out[i] = state
+        return out
+
+ENGINES = {
+    PackedEngine.name: PackedEngine,
+    CodebookEngine.name: CodebookEngine,
+    TTableEngine.name: TTableEngine,
+}
+DEFAULT_ENGINE = TTableEngine.name
+
+# engines living in their own modules (optional dependencies); importing the
+# module registers the engine
+OPTIONAL_ENGINES = {
+    "numpy": "mini_aes_numpy",
+    "bitslice": "mini_aes_bitslice",
+}
+
+# display names of third-party packages optional engines depend on
+_PACKAGE_NAMES = {"numpy": "NumPy"}
+
+def register_engine(name, engine_class):
+    """Make engine_class selectable by name in MiniAES(key, engine=name)."""
+    ENGINES[name] = engine_class
+
+def engine_names():
+    """Sorted names of every registered and optional engine."""
+    return sorted(set(ENGINES) | set(OPTIONAL_ENGINES))
+
+def get_engine(name):
+    if name not in ENGINES and name in OPTIONAL_ENGINES:
+        try:
+            importlib.import_module(OPTIONAL_ENGINES[name])
+        except ImportError as e:
+            package = _PACKAGE_NAMES.get(e.name, e.name or OPTIONAL_ENGINES[name])
+            raise ValueError(f"engine '{name}' needs {package}") from e
+    try:
+        return ENGINES[name]
+    except KeyError:
+        raise ValueError(f"Unknown engine '{name}'. Available engines: {', '.join(engine_names())}")
+
+class MiniAES:
+    """
+    Mini-AES cipher bound to a single key.
+    The key is expanded once (through the shared key schedule cache) and the
+    round keys are kept as packed 16-bit ints for every block, ECB and CBC call.
+    key can be a 4 character hex string or an int in range 0..0xFFFF.
+    engine picks the block engine by name (see ENGINES).
+    Invalid input raises ValueError.
+    """
+    def __init__(self, key, engine=DEFAULT_ENGINE):
+        if isinstance(key, int):
+            if not 0 <= key <= 0xFFFF:
+                raise ValueError("Key must be a 16-bit value")
+        else:
+            key = hex_to_int(key)
+        self.key = key
+        self.round_keys = get_key_schedule(key)
+        self.engine = get_engine(engine)(self.round_keys)
+
+    def __repr__(self):
+        return "MiniAES(key='{:04X}', engine='{}')".format(self.key, self.engine.name)
+
+    def encrypt_block(self, block):
+        return self.engine.encrypt_block(block)
+
+    def decrypt_block(self, block):
+        return self.engine.decrypt_block(block)
+
+    def encrypt_ecb_bytes(self, data, out=None):
+        """
+        ECB over a bytes-like object of 16-bit big-endian blocks.
+        The result is written into out (any writable buffer) or a new bytearray, which is returned.
+        """
+        return blocks_to_buffer(self.engine.encrypt_blocks(blocks_from_buffer(data)), out)
+
+    def decrypt_ecb_bytes(self, data, out=None):
+        return blocks_to_buffer(self.engine.decrypt_blocks(blocks_from_buffer(data)), out)
+
+    def encrypt_cbc_bytes(self, data, iv=None, out=None):
+        """
+        CBC over a bytes-like object. iv is a 16-bit int (random when None); the
+        output is the 2-byte IV followed by the ciphertext, like encrypt_cbc().
+        """
+        if iv is None:
+            iv = int(generate_iv(), 16)
+        blocks = self.engine.encrypt_cbc_blocks(blocks_from_buffer(data), iv)
+        out, view = output_buffer(out, 2 + 2 * len(blocks))
+        view[0:2] = iv.to_bytes(2, "big")
+        return blocks_to_buffer(blocks, out, 2)
+
+    def decrypt_cbc_bytes(self, data, out=None):
+        """First 2 bytes of data are the IV."""
+        blocks = blocks_from_buffer(data)
+        if len(blocks) < 2:
+            raise ValueError("Ciphertext too short. Need at least IV (2 bytes) + one block (2 bytes)")
+        return blocks_to_buffer(self.engine.decrypt_cbc_blocks(blocks[1:], blocks[0]), out)
+
+    def ctr_keystream(self, iv, start_block, count):
+        """
+        CTR keystream blocks start_block..start_block+count-1 as an array('H').
+        Counter block i is (iv + i) mod 2^16; all counters go through the engine
+        in one bulk call, so vectorized engines generate the keystream in parallel.
+        """
+        return self.engine.encrypt_blocks(_counter_blocks((iv + start_block) & 0xFFFF, count))
+
+    def crypt_ctr_range(self, data, iv, start_block=0, out=None):
+        """
+        XOR data with the CTR keystream starting at block start_block, which both
+        encrypts and decrypts. data is part of the message body (no IV) that starts
+        at block start_block, so any slice of a large ciphertext can be decrypted
+        without touching the blocks before it. A trailing partial block is allowed.
+        """
+        src = memoryview(data).cast('B')
+        keystream = blocks_to_buffer(self.ctr_keystream(iv, start_block, (len(src) + 1) // 2))
+        return _xor_bytes(src, keystream, out)
+
+    def encrypt_ctr_bytes(self, data, iv=None, out=None):
+        """CTR over a bytes-like object; output is the 2-byte IV (random when None) followed by the ciphertext."""
+        return _with_iv_prefix(data, iv, out, self.crypt_ctr_range)
+
+    def decrypt_ctr_bytes(self, data, out=None):
+        """First 2 bytes of data are the IV."""
+        src, iv = _split_iv_prefix(data)
+        return self.crypt_ctr_range(src, iv, 0, out)
+
+    def update_ctr(self, ciphertext, start_block, plaintext):
+        """
+        Re-encrypt plaintext in place at block start_block of ciphertext, a writable
+        buffer (bytearray, mmap, ...) holding IV + ciphertext from encrypt_ctr_bytes().
+        No other block is read or rewritten.
+        """
+        dst = memoryview(ciphertext).cast('B')
+        size = len(memoryview(plaintext).cast('B'))
+        offset = 2 + 2 * start_block
+        if start_block < 0 or offset + size > len(dst):
+            raise ValueError("Update range is outside the ciphertext")
+        self.crypt_ctr_range(plaintext, int.from_bytes(dst[0:2], "big"), start_block, dst[offset:offset + size])
+
+    def ofb_keystream_cycle(self, iv):
+        """
+        The whole OFB keystream for iv as big-endian bytes: E(iv), E(E(iv)), ...
+        up to where it repeats (at most 65536 blocks). Cached per key and IV.
+        """
+        return get_ofb_cycle(self.round_keys, iv)
+
+    def crypt_ofb(self, data, iv, start_block=0, out=None):
+        """
+        XOR data (message body, no IV, starting at block start_block) with the OFB
+        keystream; encrypts and decrypts. A trailing partial block is allowed.
+        """
+        src = memoryview(data).cast('B')
+        if start_block + (len(src) + 1) // 2 <= OFB_DIRECT_BLOCKS:
+            cycle = get_ofb_cycle.lookup(self.round_keys, iv)
+            if cycle is None:
+                return self._crypt_ofb_direct(src, iv, start_block, out)[0]
+        else:
+            cycle = self.ofb_keystream_cycle(iv)
+        return _crypt_ofb_cycle(src, cycle, start_block, out)
+
+    def _crypt_ofb_direct(self, src, feedback, skip=0, out=None):
+        # XOR src with the keystream blocks that follow feedback (the IV or the last
+        # keystream block used), skipping skip blocks first, one encryption per block.
+        # Returns (output, last keystream block).
+        encrypt_block = self.engine.encrypt_block
+        block = feedback
+        for _ in range(skip):
+            block = encrypt_block(block)
+        keystream = array('H')
+        for _ in range((len(src) + 1) // 2):
+            block = encrypt_block(block)
+            keystream.append(block)
+        if _NATIVE_LITTLE_ENDIAN:
+            keystream.byteswap()
+        return _xor_bytes(src, memoryview(keystream).cast('B'), out), block
+
+    def encrypt_ofb_bytes(self, data, iv=None, out=None):
+        """OFB over a bytes-like object; output is the 2-byte IV (random when None) followed by the ciphertext."""
+        return _with_iv_prefix(data, iv, out, self.crypt_ofb)
+
+    def decrypt_ofb_bytes(self, data, out=None):
+        """First 2 bytes of data are the IV."""
+        src, iv = _split_iv_prefix(data)
+        return self.crypt_ofb(src, iv, 0, out)
+
+    def encrypt_cfb_bytes(self, data, iv=None, out=None):
+        """
+        CFB over a bytes-like object of whole blocks: each ciphertext block is the
+        plaintext XOR the encryption of the previous ciphertext block (IV first).
+        Output is the 2-byte IV (random when None) followed by the ciphertext.
+        """
+        def encrypt_body(src, iv, start, dst):
+            blocks = blocks_from_buffer(src)
+            encrypt_block = self.engine.encrypt_block
+            previous_block = iv
+            for i, block in enumerate(blocks):
+                previous_block = blocks[i] = block ^ encrypt_block(previous_block)
+            return blocks_to_buffer(blocks, dst)
+        return _with_iv_prefix(data, iv, out, encrypt_body)
+
+    def decrypt_cfb_bytes(self, data, out=None):
+        """
+        First 2 bytes of data are the IV. Every keystream block is the encryption
+        of a ciphertext block, so they are all made in one bulk engine call.
+        """
+        blocks = blocks_from_buffer(data)
+        if not blocks:
+            raise ValueError("Ciphertext too short. Need at least the IV (2 bytes)")
+        keystream = self.engine.encrypt_blocks(blocks[:-1])
+        return blocks_to_buffer(_xor_block_arrays(blocks[1:], keystream), out)
+
+    def _encrypt_hex(self, plaintext_hex, iv_hex, encrypt_bytes):
+        if not iv_hex:
+            iv_hex = generate_iv()
+        if len(plaintext_hex) % 4 != 0:
+            raise ValueError("Plaintext length must be a multiple of 4 hex characters (16-bit blocks)")
+        out = encrypt_bytes(hex_to_bytes(plaintext_hex), hex_to_int(iv_hex))
+        return iv_hex + memoryview(out)[2:].hex().upper()
+
+    def _decrypt_hex(self, ciphertext_hex, decrypt_bytes):
+        if len(ciphertext_hex) < 8:
+            raise ValueError("Ciphertext too short. Need at least IV (4 chars) + one block (4 chars)")
+        if len(ciphertext_hex) % 4 != 0:
+            raise ValueError("Ciphertext length (excluding IV) must be a multiple of 4 hex characters")
+        return decrypt_bytes(hex_to_bytes(ciphertext_hex)).hex().upper()
+
+    def encrypt_ctr(self, plaintext_hex, iv_hex=None):
+        """Returns IV + ciphertext blocks, like encrypt_ctr()."""
+        return self._encrypt_hex(plaintext_hex, iv_hex, self.encrypt_ctr_bytes)
+
+    def decrypt_ctr(self, ciphertext_hex):
+        """First 4 characters of ciphertext_hex are the IV."""
+        return self._decrypt_hex(ciphertext_hex, self.decrypt_ctr_bytes)
+
+    def encrypt_ofb(self, plaintext_hex, iv_hex=None):
+        return self._encrypt_hex(plaintext_hex, iv_hex, self.encrypt_ofb_bytes)
+
+    def decrypt_ofb(self, ciphertext_hex):
+        return self._decrypt_hex(ciphertext_hex, self.decrypt_ofb_bytes)
+
+    def encrypt_cfb(self, plaintext_hex, iv_hex=None):
+        return self._encrypt_hex(plaintext_hex, iv_hex, self.encrypt_cfb_bytes)
+
+    def decrypt_cfb(self, ciphertext_hex):
+        return self._decrypt_hex(ciphertext_hex, self.decrypt_cfb_bytes)
+
+    def encryptor(self, cipher_mode="ECB", iv=None):
+        """Incremental encryptor (see CipherContext); iv is a 16-bit int, random when None."""
+        return CipherContext(self, cipher_mode, False, iv)
+
+    def decryptor(self, cipher_mode="ECB"):
+        """Incremental decryptor (see CipherContext); the IV is read from the first 2 bytes."""
+        return CipherContext(self, cipher_mode, True)
+
+    def mac(self, message_length):
+        """Streaming CBC-MAC of a message of message_length bytes (see CBCMAC)."""
+        return CBCMAC(self, message_length)
+
+    def mac_bytes(self, data):
+        """CBC-MAC tag (2 bytes) of a bytes-like message."""
+        src = memoryview(data).cast('B')
+        mac = CBCMAC(self, len(src))
+        mac.update(src)
+        return mac.digest()
+
+    def verify_macs(self, messages, tags):
+        """
+        Check many (message, tag) pairs under this key; returns a list of bools.
+        The key schedule and engine tables are set up once for the whole batch.
+        """
+        return [hmac.compare_digest(self.mac_bytes(message), bytes(tag)) for message, tag in zip(messages, tags)]
+
+    def _process_stream(self, context, src, dst, chunk_size, use_mmap):
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be a positive number of bytes")
+        written = 0
+        for chunk in _iter_stream_chunks(src, chunk_size, use_mmap):
+            written += dst.write(context.update(chunk))
+        return written + dst.write(context.finalize())
+
+    def encrypt_stream(self, src, dst, cipher_mode="ECB", iv=None, chunk_size=STREAM_CHUNK_SIZE, use_mmap=False):
+        """
+        Encrypt a binary stream (readinto) into another (write) chunk by chunk, so
+        memory stays bounded by chunk_size. Modes with an IV write the 2-byte IV
+        (random when None) first and carry the chaining state across chunks.
+        use_mmap memory-maps src instead of reading it (src must be a real file).
+        Returns the number of bytes written.
+        """
+        return self._process_stream(self.encryptor(cipher_mode, iv), src, dst, chunk_size, use_mmap)
+
+    def decrypt_stream(self, src, dst, cipher_mode="ECB", chunk_size=STREAM_CHUNK_SIZE, use_mmap=False):
+        """Inverse of encrypt_stream(); the IV is read from the first 2 bytes."""
+        return self._process_stream(self.decryptor(cipher_mode), src, dst, chunk_size, use_mmap)
+
+    def encrypt_ecb(self, plaintext_hex):
+        if len(plaintext_hex) % 4 != 0:
+            raise ValueError("Plaintext length must be a multiple of 4 hex characters (16-bit blocks)")
+        return blocks_to_hex(self.engine.encrypt_blocks(blocks_from_buffer(hex_to_bytes(plaintext_hex))))
+
+    def decrypt_ecb(self, ciphertext_hex):
+        if len(ciphertext_hex) % 4 != 0:
+            raise ValueError("Ciphertext length must be a multiple of 4 hex characters (16-bit blocks)")
+        return blocks_to_hex(self.engine.decrypt_blocks(blocks_from_buffer(hex_to_bytes(ciphertext_hex))))
+
+    def encrypt_cbc(self, plaintext_hex, iv_hex=None):
+        """Returns IV + ciphertext blocks, like encrypt_cbc()."""
+        if not iv_hex:
+            iv_hex = generate_iv()
+        if len(plaintext_hex) % 4 != 0:
+            raise ValueError("Plaintext length must be a multiple of 4 hex characters (16-bit blocks)")
+        iv = hex_to_int(iv_hex)
+        blocks = blocks_from_buffer(hex_to_bytes(plaintext_hex))
+        return iv_hex + blocks_to_hex(self.engine.encrypt_cbc_blocks(blocks, iv))
+
+    def decrypt_cbc(self, ciphertext_hex):
+        """First 4 characters of ciphertext_hex are the IV, like decrypt_cbc()."""
+        if len(ciphertext_hex) < 8:
+            raise ValueError("Ciphertext too short. Need at least IV (4 chars) + one block (4 chars)")
+        if len(ciphertext_hex) % 4 != 0:
+            raise ValueError("Ciphertext length (excluding IV) must be a multiple of 4 hex characters")
+        blocks = blocks_from_buffer(hex_to_bytes(ciphertext_hex))
+        return blocks_to_hex(self.engine.decrypt_cbc_blocks(blocks[1:], blocks[0]))
+
+class DoubleEngine(PackedEngine):
+    """Two engines in sequence: E2(E1(x)) and D1(D2(y))."""
+    name = "double"
+
+    def __init__(self, first, second):
+        self.first = first
+        self.second = second
+        self.round_keys = (first.round_keys, second.round_keys)
+
+    def encrypt_block(self, block):
+        return self.second.encrypt_block(self.first.encrypt_block(block))
+
+    def decrypt_block(self, block):
+        return self.first.decrypt_block(self.second.decrypt_block(block))
+
+    def encrypt_blocks(self, blocks):
+        return self.second.encrypt_blocks(self.first.encrypt_blocks(blocks))
+
+    def decrypt_blocks(self, blocks):
+        return self.first.decrypt_blocks(self.second.decrypt_blocks(blocks))
+
+class DoubleMiniAES(MiniAES):
+    """
+    Double Mini-AES: every block is encrypted under key1, then under key2.
+    All MiniAES modes and helpers work unchanged on the combined block cipher.
+    The 32-bit key gives far less than 32 bits of security, see
+    mini_aes_attacks.meet_in_the_middle().
+    """
+    def __init__(self, key1, key2, engine=DEFAULT_ENGINE):
+        self.inner = MiniAES(key1, engine)
+        self.outer = MiniAES(key2, engine)
+        self.key = (self.inner.key, self.outer.key)
+        self.round_keys = (self.inner.round_keys, self.outer.round_keys)
+        self.engine = DoubleEngine(self.inner.engine, self.outer.engine)
+
+    def __repr__(self):
+        return "DoubleMiniAES(key1='{:04X}', key2='{:04X}', engine='{}')".format(
+            self.inner.key, self.outer.key, self.inner.engine.name)
+
+CIPHER_MODES = ("ECB", "CBC", "CTR", "OFB", "CFB")
+# keystream modes can end on a partial block
+_PARTIAL_BLOCK_MODES = ("CTR", "OFB")
+
+class CipherContext:
+    """
+    Incremental encryptor/decryptor, created by MiniAES.encryptor()/decryptor().
+    update(data) takes any number of bytes and returns the output for every whole
+    block seen so far; a partial block is kept until more data arrives. finalize()
+    returns whatever is left and closes the context. copy() forks the context with
+    its chaining state, like hashlib objects.
+    Output matches the one-shot *_bytes methods: an encryptor emits the 2-byte IV
+    first, a decryptor takes the IV from the first 2 bytes.
+    """
+    def __init__(self, cipher, cipher_mode, decrypt, iv=None):
+        cipher_mode = cipher_mode.upper()
+        if cipher_mode not in CIPHER_MODES:
+            raise ValueError(f"Unsupported cipher mode '{cipher_mode}'. Use one of: {', '.join(CIPHER_MODES)}")
+        self.cipher = cipher
+        self.cipher_mode = cipher_mode
+        self.decrypt = decrypt
+        self._pending = bytearray()
+        self._block_index = 0
+        self._finalized = False
+        # the IV is still to be written (encryptor) or read (decryptor)
+        self._iv_pending = cipher_mode != "ECB"
+        if cipher_mode != "ECB" and not decrypt and iv is None:
+            iv = int(generate_iv(), 16)
+        self.iv = iv
+        self._chain = iv
+        self._ofb_cycle = None
+
+    def copy(self):
+        clone = copy.copy(self)
+        clone._pending = bytearray(self._pending)
+        return clone
+
+    def update(self, data):
+        if self._finalized:
+            raise ValueError("update() called after finalize()")
+        src = memoryview(data).cast('B')
+        if self._pending:
+            src = memoryview(self._pending + src)
+        prefix = b""
+        if self._iv_pending:
+            if self.decrypt:
+                if len(src) < 2:
+                    self._pending = bytearray(src)
+                    return b""
+                self.iv = self._chain = int.from_bytes(src[0:2], "big")
+                src = src[2:]
+            else:
+                prefix = self.iv.to_bytes(2, "big")
+            self._iv_pending = False
+        whole = len(src) & ~1
+        self._pending = bytearray(src[whole:])
+        return prefix + self._process(src[:whole])
+
+    def finalize(self):
+        if self._finalized:
+            raise ValueError("finalize() called twice")
+        output = self.update(b"")
+        self._finalized = True
+        if self.decrypt and self._iv_pending:
+            raise ValueError("Ciphertext too short. Need at least the IV (2 bytes)")
+        if self.decrypt and self.cipher_mode == "CBC" and self._block_index == 0:
+            raise ValueError("Ciphertext too short. Need at least IV (2 bytes) + one block (2 bytes)")
+        if self._pending:
+            if self.cipher_mode not in _PARTIAL_BLOCK_MODES:
+                raise ValueError("Data length must be a multiple of 2 bytes (16-bit blocks)")
+            output += self._process(memoryview(self._pending))
+            self._pending = bytearray()
+        return output
+
+    def _process(self, data):
+        # data holds whole blocks, except for the final call of a keystream mode
+        if not data:
+            return b""
+        cipher, engine, mode = self.cipher, self.cipher.engine, self.cipher_mode
+        start_block = self._block_index
+        self._block_index += (len(data) + 1) // 2
+        if mode == "CTR":
+            return bytes(cipher.crypt_ctr_range(data, self.iv, start_block))
+        if mode == "OFB":
+            if start_block == 0:
+                # the cache is consulted once per message, like a crypt_ofb() call
+                self._ofb_cycle = get_ofb_cycle.lookup(cipher.round_keys, self.iv)
+            if self._ofb_cycle is None:
+                if self._block_index <= OFB_DIRECT_BLOCKS:
+                    # continue the keystream from the last block instead of from the IV;
+                    # past OFB_DIRECT_BLOCKS the cycle is used and _chain goes unused
+                    output, self._chain = cipher._crypt_ofb_direct(data, self._chain)
+                    return bytes(output)
+                self._ofb_cycle = cipher.ofb_keystream_cycle(self.iv)
+            return bytes(_crypt_ofb_cycle(data, self._ofb_cycle, start_block))
+        blocks = blocks_from_buffer(data)
+        if mode == "ECB":
+            result = engine.decrypt_blocks(blocks) if self.decrypt else engine.encrypt_blocks(blocks)
+        elif mode == "CBC":
+            if self.decrypt:
+                result = engine.decrypt_cbc_blocks(blocks, self._chain)
+                self._chain = blocks[-1]
+            else:
+                result = engine.encrypt_cbc_blocks(blocks, self._chain)
+                self._chain = result[-1]
+        elif self.decrypt: # CFB
+            feed = array('H', [self._chain])
+            feed.extend(blocks[:-1])
+            self._chain = blocks[-1]
+            result = _xor_block_arrays(blocks, engine.encrypt_blocks(feed))
+        else:
+            encrypt_block = engine.encrypt_block
+            previous_block = self._chain
+            for i, block in enumerate(blocks):
+                previous_block = blocks[i] = block ^ encrypt_block(previous_block)
+            self._chain = previous_block
+            result = blocks
+        if _NATIVE_LITTLE_ENDIAN:
+            result.byteswap()
+        return result.tobytes()
+
+class CBCMAC:
+    """
+    Streaming CBC-MAC, created by MiniAES.mac(). The message is CBC-encrypted
+    under a zero IV and only the last block is kept as the 2-byte tag. The
+    message length in bytes must be known upfront: it is MAC'd first as a 64-bit
+    prefix, which keeps tags of messages of different lengths independent. An odd
+    trailing byte is zero-padded to a whole block.
+    """
+    digest_size = 2
+
+    def __init__(self, cipher, message_length):
+        if not 0 <= message_length < 1 << 64:
+            raise ValueError("Message length must fit in 64 bits")
+        self.cipher = cipher
+        self.message_length = message_length
+        self._received = 0
+        self._pending = bytearray()
+        self._chain = 0
+        self._chain_blocks(message_length.to_bytes(8, "big"))
+
+    def _chain_blocks(self, data):
+        if data:
+            self._chain = self.cipher.engine.encrypt_cbc_blocks(blocks_from_buffer(data), self._chain)[-1]
+
+    def copy(self):
+        clone = copy.copy(self)
+        clone._pending = bytearray(self._pending)
+        return clone
+
+    def update(self, data):
+        src = memoryview(data).cast('B')
+        if self._received + len(src) > self.message_length:
+            raise ValueError(f"Message longer than the declared {self.message_length} bytes")
+        self._received += len(src)
+        if self._pending:
+            src = memoryview(self._pending + src)
+        whole = len(src) & ~1
+        self._chain_blocks(src[:whole])
+        self._pending = bytearray(src[whole:])
+
+    def digest(self):
+        if self._received != self.message_length:
+            raise ValueError(f"Message shorter than the declared {self.message_length} bytes")
+        tag = self._chain
+        if self._pending:
+            tag = self.cipher.encrypt_block(tag ^ (self._pending[0] << 8))
+        return tag.to_bytes(2, "big")
+
+    def hexdigest(self):
+        return self.digest().hex().upper()
+
+    def verify(self, tag):
+        """Constant-time comparison with tag (bytes, or a 4 character hex string)."""
+        if isinstance(tag, str):
+            tag = hex_to_bytes(tag)
+        return hmac.compare_digest(self.digest(), bytes(tag))
+
+# compact execution trace
+# The traced functions record, per block, the block cipher input and every
+# intermediate round state as packed 16-bit ints in one array('H'); the process
+# log text is rebuilt from them only when it is read. Which step produced each
+# state is fixed per direction (ENCRYPT_STEPS/DECRYPT_STEPS).
+STEP_ADD_ROUND_KEY = 0
+STEP_SUB_NIBBLES = 1
+STEP_SHIFT_ROWS = 2
+STEP_MIX_COLUMNS = 3
+STEP_INV_SUB_NIBBLES = 4
+STEP_INV_SHIFT_ROWS = 5
+STEP_INV_MIX_COLUMNS = 6
+
+STEP_NAMES = ["AddRoundKey", "SubNibbles", "ShiftRows", "MixColumns",
+              "InvSubNibbles", "InvShiftRows", "InvMixColumns"]
+
+ENCRYPT_STEPS = array('B', [STEP_ADD_ROUND_KEY]
+                      + [STEP_SUB_NIBBLES, STEP_SHIFT_ROWS, STEP_MIX_COLUMNS, STEP_ADD_ROUND_KEY] * (NUM_ROUNDS - 1)
+                      + [STEP_SUB_NIBBLES, STEP_SHIFT_ROWS, STEP_ADD_ROUND_KEY])
+DECRYPT_STEPS = array('B', [STEP_ADD_ROUND_KEY, STEP_INV_SHIFT_ROWS, STEP_INV_SUB_NIBBLES, STEP_ADD_ROUND_KEY]
+                      + [STEP_INV_MIX_COLUMNS, STEP_INV_SHIFT_ROWS, STEP_INV_SUB_NIBBLES, STEP_ADD_ROUND_KEY] * (NUM_ROUNDS - 1))
+
+def _round_headers(decrypt):
+    # the "Round r" line printed before the state at each position
+    if decrypt:
+        headers = {0: f"\nRound 0: Initial AddRoundKey with RK{NUM_ROUNDS}", 1: "\nRound 1:"}
+        for r in range(NUM_ROUNDS - 1):
+            headers[4 + 4 * r] = f"\nRound {r + 2}:"
+        return headers
+    headers = {0: "\nRound 0: Initial AddRoundKey"}
+    for r in range(1, NUM_ROUNDS):
+        headers[1 + 4 * (r - 1)] = f"\nRound {r}:"
+    headers[1 + 4 * (NUM_ROUNDS - 1)] = f"\nRound {NUM_ROUNDS} (Final):"
+    return headers
+
+_ROUND_HEADERS = (_round_headers(False), _round_headers(True))
+
+def _matrix_to_int(matrix):
+    nibbles = matrix_to_nibbles(matrix)
+    return (nibbles[0] << 12) | (nibbles[1] << 8) | (nibbles[2] << 4) | nibbles[3]
+
+def _int_to_matrix(value):
+    return nibbles_to_matrix([(value >> 12) & 0xF, (value >> 8) & 0xF, (value >> 4) & 0xF, value & 0xF])
+
+def _trace_states(block, round_keys, decrypt, out):
+    # append the round states of one block, in ENCRYPT_STEPS/DECRYPT_STEPS order.
+    # The traced path keeps to the reference matrix functions and the round key
+    # matrices of key_expansion(), so it stays independent of the packed engines.
+    states = []
+    state = _int_to_matrix(block)
+    if decrypt:
+        state = add_round_key(state, round_keys[NUM_ROUNDS])
+        states.append(state)
+        state = shift_rows(state)
+        states.append(state)
+        state = sub_nibbles(state, INV_S_BOX)
+        states.append(state)
+        state = add_round_key(state, round_keys[NUM_ROUNDS-1])
+        states.append(state)
+        for r in range(NUM_ROUNDS-2, -1, -1):
+            state = mix_columns(state, INV_MIX_COL_MATRIX)
+            states.append(state)
+            state = shift_rows(state)
+            states.append(state)
+            state = sub_nibbles(state, INV_S_BOX)
+            states.append(state)
+            state = add_round_key(state, round_keys[r])
+            states.append(state)
+    else:
+        state = add_round_key(state, round_keys[0])
+        states.append(state)
+        for r in range(1, NUM_ROUNDS):
+            state = sub_nibbles(state, S_BOX)
+            states.append(state)
+            state = shift_rows(state)
+            states.append(state)
+            state = mix_columns(state, MIX_COL_MATRIX)
+            states.append(state)
+            state = add_round_key(state, round_keys[r])
+            states.append(state)
+        state = sub_nibbles(state, S_BOX)
+        states.append(state)
+        state = shift_rows(state)
+        states.append(state)
+        state = add_round_key(state, round_keys[NUM_ROUNDS])
+        states.append(state)
+    out.extend(map(_matrix_to_int, states))
+    return out[-1]
+
+class ExecutionTrace:
+    """
+    Process log of a traced encrypt/decrypt call, stored compactly.
+    It reads like the list of log lines it replaces: iterate it, index it, take
+    len() or compare it with a list; the text is rendered on demand. Per block it
+    keeps the block cipher input and the round states (states, STATES_PER_BLOCK
+    values per block, step order in ENCRYPT_STEPS/DECRYPT_STEPS), plus the round
+    keys. blocks(start, stop) gives the log lines of a block range only.
+    """
+    STATES_PER_BLOCK = 1 + len(ENCRYPT_STEPS)
+
+    def __init__(self, cipher_mode, decrypt, key_hex, iv_hex=None):
+        self.cipher_mode = cipher_mode
+        self.decrypt = decrypt
+        self.key_hex = key_hex
+        self.iv_hex = iv_hex
+        self.header = [] # leading lines, written as the call progresses
+        self.text_hex = None # set once the input is split into blocks
+        self.round_keys = array('H')
+        self.states = array('H')
+        self.tail = [] # lines of a block that failed part way
+        self.finished = False
+        self._range = None # (start, stop) for a block range view
+        self._key_lines = None
+        self._per_block = None # lines per block, once known
+
+    # recording (used by the traced functions)
+    def split_blocks(self, text_hex):
+        self.text_hex = text_hex
+
+    def record_block(self, block, round_keys):
+        """
+        Record the rounds of one block cipher call; returns its output.
+        round_keys are the round key matrices from key_expansion().
+        """
+        if not self.round_keys:
+            self.round_keys.extend(map(_matrix_to_int, round_keys))
+        self.states.append(block)
+        return _trace_states(block, round_keys, self.decrypt and self.cipher_mode in ("ECB", "CBC"), self.states)
+
+    # reading
+    @property
+    def block_count(self):
+        return len(self.states) // self.STATES_PER_BLOCK
+
+    @property
+    def steps(self):
+        return DECRYPT_STEPS if self.decrypt and self.cipher_mode in ("ECB", "CBC") else ENCRYPT_STEPS
+
+    def block_states(self, index):
+        """(block cipher input, round states) of block index."""
+        start = index * self.STATES_PER_BLOCK
+        return self.states[start], self.states[start + 1:start + self.STATES_PER_BLOCK]
+
+    def blocks(self, start=0, stop=None):
+        """A view holding only the log lines of blocks start..stop-1."""
+        view = copy.copy(self)
+        view._range = range(self.block_count)[start:stop]
+        return view
+
+    def text(self):
+        return "\n".join(self)
+
+    def _block_text(self, index):
+        text = self.text_hex[4 * index:4 * index + 4]
+        # text_hex is ASCII bytes when the trace is read from a binary trace file
+        return text if isinstance(text, str) else str(text, 'ascii')
+
+    def _output_block(self, index):
+        cipher_input, states = self.block_states(index)
+        result = states[-1]
+        if self.cipher_mode == "CBC" and self.decrypt:
+            previous = self.iv_hex if index == 0 else self._block_text(index - 1)
+            return result ^ int(previous, 16)
+        if self.cipher_mode in ("CTR", "OFB", "CFB"):
+            return hex_to_int(self._block_text(index)) ^ result
+        return result
+
+    def _cipher_lines(self, index, block_text, prefix):
+        # the per-block part of the ECB log
+        if self._key_lines is None:
+            self._key_lines = key_expansion(hex_to_nibbles(self.key_hex))[1]
+        cipher_input, states = self.block_states(index)
+        decrypt = self.steps is DECRYPT_STEPS
+        state_matrix = nibbles_to_matrix(hex_to_nibbles("{:04X}".format(cipher_input)))
+        key_matrix = nibbles_to_matrix(hex_to_nibbles(self.key_hex))
+        yield f"{prefix}\nProcessing Block {1 if prefix else index + 1}"
+        yield f"{prefix}Current Block: {block_text}"
+        yield f"{prefix}Initial State Matrix:\n{state_matrix[0]}\n{state_matrix[1]}"
+        yield f"{prefix}Key Matrix:\n{key_matrix[0]}\n{key_matrix[1]}"
+        for line in self._key_lines:
+            yield f"{prefix}  {line}"
+        headers = _ROUND_HEADERS[decrypt]
+        last = len(states) - 1
+        for position, (step, state) in enumerate(zip(self.steps, states)):
+            if position in headers:
+                yield prefix + headers[position]
+            label = "final AddRoundKey" if position == last and not decrypt else STEP_NAMES[step]
+            yield f"{prefix}After {label}: {state:04X}"
+        yield f"{prefix}Block {1 if prefix else index + 1} Result: {states[-1]:04X}"
+
+    def _nested_lines(self, index, block_text):
+        # the single-block ECB log that CBC and the feedback modes indent
+        decrypt = self.steps is DECRYPT_STEPS
+        yield f"  --- ECB Mode {'Decryption' if decrypt else 'Encryption'} ---"
+        yield f"  Split into 1 blocks: {[block_text]}"
+        yield from self._cipher_lines(index, block_text, "  ")
+        result = "{:04X}".format(self.block_states(index)[1][-1])
+        yield f"  \nFinal {'plaintext' if decrypt else 'ciphertext'} (all blocks): {result}"
+
+    def _block_lines(self, index):
+        block_text = self._block_text(index)
+        if self.cipher_mode == "ECB":
+            yield from self._cipher_lines(index, block_text, "")
+            return
+        yield f"\nProcessing Block {index + 1}"
+        cipher_input, states = self.block_states(index)
+        if self.cipher_mode == "CBC":
+            if self.decrypt:
+                previous = self.iv_hex if index == 0 else self._block_text(index - 1)
+                yield f"Encrypted Block: {block_text}"
+                yield f"Previous Block (IV for first block): {previous}"
+                yield "Block decryption log:"
+                yield from self._nested_lines(index, block_text)
+                yield f"After XOR with previous block: {self._output_block(index):04X}"
+            else:
+                previous = self.iv_hex if index == 0 else "{:04X}".format(self.block_states(index - 1)[1][-1])
+                yield f"Current Block: {block_text}"
+                yield f"Previous Block (IV for first block): {previous}"
+                yield f"After XOR with previous block: {cipher_input:04X}"
+                yield "Block encryption log:"
+                yield from self._nested_lines(index, "{:04X}".format(cipher_input))
+            return
+        yield f"{'Encrypted Block' if self.decrypt else 'Current Block'}: {block_text}"
+        yield self._feed_line(index, cipher_input)
+        yield "Counter encryption log:" if self.cipher_mode == "CTR" else "Block encryption log:"
+        yield from self._nested_lines(index, "{:04X}".format(cipher_input))
+        yield f"Keystream Block: {states[-1]:04X}"
+        yield f"After XOR with keystream: {self._output_block(index):04X}"
+
+    def _feed_line(self, index, feed_block):
+        if self.cipher_mode == "CTR":
+            return f"Counter Block (IV + {index}): {feed_block:04X}"
+        if self.cipher_mode == "OFB":
+            return f"Previous Output Block (IV for first block): {feed_block:04X}"
+        return f"Previous Ciphertext Block (IV for first block): {feed_block:04X}"
+
+    def _final_line(self):
+        output = "".join("{:04X}".format(self._output_block(i)) for i in range(self.block_count))
+        if self.cipher_mode == "ECB":
+            return f"\nFinal {'plaintext' if self.decrypt else 'ciphertext'} (all blocks): {output}"
+        if self.decrypt:
+            return f"\nFinal plaintext: {output}"
+        return f"\nFinal ciphertext (IV + encrypted blocks): {self.iv_hex}{output}"
+
+    def __iter__(self):
+        return self._lines_from(0)
+
+    def lines(self, start=0, stop=None):
+        """The log lines start..stop-1; only the blocks they fall in are rendered."""
+        lines = self._lines_from(start)
+        return lines if stop is None else itertools.islice(lines, max(0, stop - start))
+
+    def _lead_lines(self):
+        if self._range is not None:
+            return []
+        lines = list(self.header)
+        if self.text_hex is not None:
+            blocks = [self._block_text(i) for i in range(len(self.text_hex) // 4)]
+            lines.append(f"Split into {len(blocks)} blocks: {blocks}")
+        return lines
+
+    def _lines_from(self, start):
+        # every block renders to the same number of lines, so whole blocks
+        # before start are skipped without rendering them
+        lead = len(self.header) + (self.text_hex is not None) if self._range is None else 0
+        if start < lead:
+            yield from self._lead_lines()[start:]
+            start = 0
+        else:
+            start -= lead
+        blocks = self._range if self._range is not None else range(self.block_count)
+        per_block = self._lines_per_block()
+        first, offset = divmod(start, per_block) if per_block else (0, 0)
+        for index in blocks[first:]:
+            yield from itertools.islice(self._block_lines(index), offset, None)
+            offset = 0
+        if self._range is not None:
+            return
+        start = max(0, start - len(blocks) * per_block)
+        yield from self.tail[start:]
+        if self.finished and start <= len(self.tail):
+            yield self._final_line()
+
+    def _lines_per_block(self):
+        if self._per_block is None and self.block_count:
+            self._per_block = sum(1 for _ in self._block_lines(0))
+        return self._per_block or 0
+
+    def __len__(self):
+        if self._range is not None:
+            return len(self._range) * self._lines_per_block()
+        return (len(self.header) + (self.text_hex is not None) + self.block_count * self._lines_per_block()
+                + len(self.tail) + self.finished)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step < 0:
+                return [self[i] for i in range(start, stop, step)]
+            return list(self.lines(start, stop))[::step]
+        size = len(self)
+        if index < 0:
+            index += size
+        if not 0 <= index < size:
+            raise IndexError("trace index out of range")
+        return next(self._lines_from(index))
+
+    def __eq__(self, other):
+        if isinstance(other, (ExecutionTrace, list, tuple)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self):
+        return "<ExecutionTrace {} {}: {} blocks, {} lines>".format(
+            self.cipher_mode, "decryption" if self.decrypt else "encryption", self.block_count, len(self))
+
+def _ecb_traced(text_hex, key_hex, decrypt):
+    log = ExecutionTrace("ECB", decrypt, key_hex)
+    log.header.append(f"--- ECB Mode {'Decryption' if decrypt else 'Encryption'} ---")
+
     # Validate input length
-    if len(plaintext_hex) % 4 != 0:
-        return None, "Plaintext length must be a multiple of 4 hex characters (16-bit blocks)", log
-    
-    blocks = [plaintext_hex[i:i+4] for i in range(0, len(plaintext_hex), 4)]
-    log.append(f"Split into {len(blocks)} blocks: {blocks}")
-    
-    ciphertext_blocks = []
-    
-    for i, block in enumerate(blocks):
-        log.append(f"\nProcessing Block {i+1}")
-        log.append(f"Current Block: {block}")
-        
+    if len(text_hex) % 4 != 0:
+        label = "Ciphertext" if decrypt else "Plaintext"
+        return None, f"{label} length must be a multiple of 4 hex characters (16-bit blocks)", log
+    log.split_blocks(text_hex)
+
+    round_keys = None
+    output_blocks = array('H')
+    for i in range(len(text_hex) // 4):
+        block = text_hex[4*i:4*i+4]
         try:
-            # Convert inputs to nibble lists
-            plain_nibbles = hex_to_nibbles(block)
-            key_nibbles = hex_to_nibbles(key_hex)
-            
-            # Convert nibble lists to state matrix and key matrix
-            state_matrix = nibbles_to_matrix(plain_nibbles)
-            key_matrix = nibbles_to_matrix(key_nibbles)
-            
-            log.append(f"Initial State Matrix:\n{state_matrix[0]}\n{state_matrix[1]}")
-            log.append(f"Key Matrix:\n{key_matrix[0]}\n{key_matrix[1]}")
-            
-            # Key Expansion
-            round_keys, key_expansion_log = key_expansion(key_nibbles)
-            log.extend("  " + line for line in key_expansion_log)
-            
-            # Initial AddRoundKey
-            log.append("\nRound 0: Initial AddRoundKey")
-            rk0 = round_keys[0]
-            state_matrix = add_round_key(state_matrix, rk0)
-            log.append(f"After AddRoundKey: {matrix_to_hex(state_matrix)}")
-            
-            # Main Rounds (1 to NUM_ROUNDS-1)
-            for r in range(1, NUM_ROUNDS):
-                log.append(f"\nRound {r}:")
-                
-                # SubNibbles
-                state_matrix = sub_nibbles(state_matrix, S_BOX)
-                log.append(f"After SubNibbles: {matrix_to_hex(state_matrix)}")
-                
-                # ShiftRows
-                state_matrix = shift_rows(state_matrix)
-                log.append(f"After ShiftRows: {matrix_to_hex(state_matrix)}")
-                
-                # MixColumns
-                state_matrix = mix_columns(state_matrix, MIX_COL_MATRIX)
-                log.append(f"After MixColumns: {matrix_to_hex(state_matrix)}")
-                
-                # AddRoundKey
-                state_matrix = add_round_key(state_matrix, round_keys[r])
-                log.append(f"After AddRoundKey: {matrix_to_hex(state_matrix)}")
-            
-            # Final Round (no MixColumns)
-            log.append(f"\nRound {NUM_ROUNDS} (Final):")
-            
-            # SubNibbles
-            state_matrix = sub_nibbles(state_matrix, S_BOX)
-            log.append(f"After SubNibbles: {matrix_to_hex(state_matrix)}")
-            
-            # ShiftRows
-            state_matrix = shift_rows(state_matrix)
-            log.append(f"After ShiftRows: {matrix_to_hex(state_matrix)}")
-            
-            # AddRoundKey
-            state_matrix = add_round_key(state_matrix, round_keys[NUM_ROUNDS])
-            log.append(f"After final AddRoundKey: {matrix_to_hex(state_matrix)}")
-            
-            cipher_block = matrix_to_hex(state_matrix)
-            ciphertext_blocks.append(cipher_block)
-            log.append(f"Block {i+1} Result: {cipher_block}")
-            
+            block_value = hex_to_int(block)
+            if round_keys is None:
+                round_keys = key_expansion(hex_to_nibbles(key_hex))[0]
         except ValueError as e:
+            log.tail += [f"\nProcessing Block {i+1}", f"Current Block: {block}"]
             return None, str(e), log
-        except Exception as e:
-            return None, f"Unexpected error in block {i+1}: {str(e)}", log
-    
-    final_ciphertext = "".join(ciphertext_blocks)
-    log.append(f"\nFinal ciphertext (all blocks): {final_ciphertext}")
-    return final_ciphertext, None, log
+        output_blocks.append(log.record_block(block_value, round_keys))
+
+    log.finished = True
+    return blocks_to_hex(output_blocks), None, log
+
+def _run_fast(key_hex, engine, method_name, *args):
+    # trace-free entry points report errors the same way as the traced ones
+    try:
+        return getattr(MiniAES(key_hex, engine), method_name)(*args), None, []
+    except ValueError as e:
+        return None, str(e), []
+
+def encrypt(plaintext_hex, key_hex, trace=False, engine=DEFAULT_ENGINE):
+    """
+    Encrypt using ECB mode.
+    plaintext_hex must be a multiple of 4 hex characters (16-bit blocks)
+    With trace=False only the cipher arithmetic runs (on the given block engine,
+    see ENGINES) and the returned log is empty; pass trace=True to get the
+    detailed process log.
+    """
+    if not trace:
+        return _run_fast(key_hex, engine, "encrypt_ecb", plaintext_hex)
+    return _ecb_traced(plaintext_hex, key_hex, False)
 
-def decrypt(ciphertext_hex, key_hex):
+def decrypt(ciphertext_hex, key_hex, trace=False, engine=DEFAULT_ENGINE):
     """
     Decrypt using ECB mode.
     ciphertext_hex must be a multiple of 4 hex characters (16-bit blocks)
+    With trace=False the returned log is empty (engine picks the block engine);
+    pass trace=True for the detailed process log.
     """
-    log = []
-    log.append("--- ECB Mode Decryption ---")
-    
-    # Validate input length
-    if len(ciphertext_hex) % 4 != 0:
-        return None, "Ciphertext length must be a multiple of 4 hex characters (16-bit blocks)", log
-    
-    blocks = [ciphertext_hex[i:i+4] for i in range(0, len(ciphertext_hex), 4)]
-    log.append(f"Split into {len(blocks)} blocks: {blocks}")
-    
-    plaintext_blocks = []
-    
-    for i, block in enumerate(blocks):
-        log.append(f"\nProcessing Block {i+1}")
-        log.append(f"Current Block: {block}")
-        
-        try:
-            # Convert inputs to nibble lists
-            cipher_nibbles = hex_to_nibbles(block)
-            key_nibbles = hex_to_nibbles(key_hex)
-            
-            # Convert nibble lists to state matrix and key matrix
-            state_matrix = nibbles_to_matrix(cipher_nibbles)
-            key_matrix = nibbles_to_matrix(key_nibbles)
-            
-            log.append(f"Initial State Matrix:\n{state_matrix[0]}\n{state_matrix[1]}")
-            log.append(f"Key Matrix:\n{key_matrix[0]}\n{key_matrix[1]}")
-            
-            # Key Expansion
-            round_keys, key_expansion_log = key_expansion(key_nibbles)
-            log.extend("  " + line for line in key_expansion_log)
-            
-            # Initial AddRoundKey with last round key
-            log.append(f"\nRound 0: Initial AddRoundKey with RK{NUM_ROUNDS}")
-            state_matrix = add_round_key(state_matrix, round_keys[NUM_ROUNDS])
-            log.append(f"After AddRoundKey: {matrix_to_hex(state_matrix)}")
-            
-            # First Round - Special Case (no MixColumns)
-            log.append("\nRound 1:")
-            
-            # Inverse ShiftRows
-            state_matrix = shift_rows(state_matrix)  # ShiftRows is its own inverse
-            log.append(f"After InvShiftRows: {matrix_to_hex(state_matrix)}")
-            
-            # Inverse SubNibbles
-            state_matrix = sub_nibbles(state_matrix, INV_S_BOX)
-            log.append(f"After InvSubNibbles: {matrix_to_hex(state_matrix)}")
-            
-            # AddRoundKey with second-to-last round key
-            state_matrix = add_round_key(state_matrix, round_keys[NUM_ROUNDS-1])
-            log.append(f"After AddRoundKey: {matrix_to_hex(state_matrix)}")
-            
-            # Main Rounds (NUM_ROUNDS-2 down to 0)
-            for r in range(NUM_ROUNDS-2, -1, -1):
-                log.append(f"\nRound {NUM_ROUNDS-r}:")
-                
-                # Inverse MixColumns
-                state_matrix = mix_columns(state_matrix, INV_MIX_COL_MATRIX)
-                log.append(f"After InvMixColumns: {matrix_to_hex(state_matrix)}")
-                
-                # Inverse ShiftRows
-                state_matrix = shift_rows(state_matrix)
-                log.append(f"After InvShiftRows: {matrix_to_hex(state_matrix)}")
-                
-                # Inverse SubNibbles
-                state_matrix = sub_nibbles(state_matrix, INV_S_BOX)
-                log.append(f"After InvSubNibbles: {matrix_to_hex(state_matrix)}")
-                
-                # AddRoundKey
-                state_matrix = add_round_key(state_matrix, round_keys[r])
-                log.append(f"After AddRoundKey: {matrix_to_hex(state_matrix)}")
-            
-            plain_block = matrix_to_hex(state_matrix)
-            plaintext_blocks.append(plain_block)
-            log.append(f"Block {i+1} Result: {plain_block}")
-            
-        except ValueError as e:
-            return None, str(e), log
-        except Exception as e:
-            return None, f"Unexpected error in block {i+1}: {str(e)}", log
-    
-    final_plaintext = "".join(plaintext_blocks)
-    log.append(f"\nFinal plaintext (all blocks): {final_plaintext}")
-    return final_plaintext, None, log
+    if not trace:
+        return _run_fast(key_hex, engine, "decrypt_ecb", ciphertext_hex)
+    return _ecb_traced(ciphertext_hex, key_hex, True)
 
 def generate_iv():
     """Generate a random 16-bit (4 hex characters) initialization vector."""
     return "{:04X}".format(random.randint(0, 0xFFFF))
 
-def encrypt_cbc(plaintext_hex, key_hex, iv_hex=None):
+def encrypt_cbc(plaintext_hex, key_hex, iv_hex=None, trace=False, engine=DEFAULT_ENGINE):
     """
     Encrypt using CBC mode.
     plaintext_hex must be a multiple of 4 hex characters (16-bit blocks)
+    With trace=False the returned log is empty (engine picks the block engine);
+    pass trace=True for the detailed process log.
     """
     if not iv_hex:
         iv_hex = generate_iv()
-    
-    log = []
-    log.append("--- CBC Mode Encryption ---")
-    log.append(f"IV: {iv_hex}")
+    if not trace:
+        return _run_fast(key_hex, engine, "encrypt_cbc", plaintext_hex, iv_hex)
+
+    log = ExecutionTrace("CBC", False, key_hex, iv_hex)
+    log.header += ["--- CBC Mode Encryption ---", f"IV: {iv_hex}"]
     
     # Validate input length
     if len(plaintext_hex) % 4 != 0:
         return None, "Plaintext length must be a multiple of 4 hex characters (16-bit blocks)", log
-    
-    blocks = [plaintext_hex[i:i+4] for i in range(0, len(plaintext_hex), 4)]
-    log.append(f"Split into {len(blocks)} blocks: {blocks}")
+    log.split_blocks(plaintext_hex)
+
+    try:
+        hex_to_int(iv_hex)
+    except ValueError as e:
+        return None, f"Invalid IV: {e}", log
     
     previous_block = iv_hex
-    ciphertext_blocks = []
+    round_keys = None
+    ciphertext_blocks = array('H')
     
-    for i, block in enumerate(blocks):
-        log.append(f"\nProcessing Block {i+1}")
-        log.append(f"Current Block: {block}")
-        log.append(f"Previous Block (IV for first block): {previous_block}")
-        
+    for i in range(len(plaintext_hex) // 4):
+        block = plaintext_hex[4*i:4*i+4]
         # XOR with previous ciphertext (or IV for first block)
-        xored_block = "{:04X}".format(int(block, 16) ^ int(previous_block, 16))
-        log.append(f"After XOR with previous block: {xored_block}")
+        try:
+            xored_block = hex_to_int(block) ^ hex_to_int(previous_block)
+        except ValueError as e:
+            log.tail += [f"\nProcessing Block {i+1}", f"Current Block: {block}",
+                         f"Previous Block (IV for first block): {previous_block}"]
+            return None, f"Error in block {i+1}: {e}", log
+        try:
+            if round_keys is None:
+                round_keys = key_expansion(hex_to_nibbles(key_hex))[0]
+        except ValueError as e:
+            log.tail += [f"\nProcessing Block {i+1}", f"Current Block: {block}",
+                         f"Previous Block (IV for first block): {previous_block}",
+                         f"After XOR with previous block: {xored_block:04X}"]
+            return None, f"Error in block {i+1}: {e}", log
         
         # Encrypt the XORed block
-        cipher_block, err, block_log = encrypt(xored_block, key_hex)
-        if err:
-            return None, f"Error in block {i+1}: {err}", log
-            
-        log.append("Block encryption log:")
-        log.extend("  " + line for line in block_log)
-        
+        cipher_block = log.record_block(xored_block, round_keys)
         ciphertext_blocks.append(cipher_block)
-        previous_block = cipher_block
+        previous_block = "{:04X}".format(cipher_block)
     
-    final_ciphertext = iv_hex + "".join(ciphertext_blocks)
-    log.append(f"\nFinal ciphertext (IV + encrypted blocks): {final_ciphertext}")
-    return final_ciphertext, None, log
+    log.finished = True
+    return iv_hex + blocks_to_hex(ciphertext_blocks), None, log
 
-def decrypt_cbc(ciphertext_hex, key_hex):
+def decrypt_cbc(ciphertext_hex, key_hex, trace=False, engine=DEFAULT_ENGINE):
     """
     Decrypt using CBC mode.
     First 4 characters of ciphertext_hex are the IV.
     Rest must be a multiple of 4 hex characters (16-bit blocks)
+    With trace=False the returned log is empty (engine picks the block engine);
+    pass trace=True for the detailed process log.
     """
-    log = []
-    log.append("--- CBC Mode Decryption ---")
+    if not trace:
+        return _run_fast(key_hex, engine, "decrypt_cbc", ciphertext_hex)
+
+    log = ExecutionTrace("CBC", True, key_hex)
+    log.header.append("--- CBC Mode Decryption ---")
     
     if len(ciphertext_hex) < 8:  # Need at least IV (4) + one block (4)
         return None, "Ciphertext too short. Need at least IV (4 chars) + one block (4 chars)", log
@@ -446,42 +1739,246 @@ def decrypt_cbc(ciphertext_hex, key_hex):
     # Extract IV and ciphertext blocks
     iv_hex = ciphertext_hex[:4]
     ciphertext = ciphertext_hex[4:]
-    log.append(f"IV: {iv_hex}")
+    log.iv_hex = iv_hex
+    log.header.append(f"IV: {iv_hex}")
     
     if len(ciphertext) % 4 != 0:
         return None, "Ciphertext length (excluding IV) must be a multiple of 4 hex characters", log
-    
-    blocks = [ciphertext[i:i+4] for i in range(0, len(ciphertext), 4)]
-    log.append(f"Split into {len(blocks)} blocks: {blocks}")
+    log.split_blocks(ciphertext)
+
+    try:
+        hex_to_int(iv_hex)
+    except ValueError as e:
+        return None, f"Invalid IV: {e}", log
     
     previous_block = iv_hex
-    plaintext_blocks = []
+    round_keys = None
+    plaintext_blocks = array('H')
     
-    for i, block in enumerate(blocks):
-        log.append(f"\nProcessing Block {i+1}")
-        log.append(f"Encrypted Block: {block}")
-        log.append(f"Previous Block (IV for first block): {previous_block}")
-        
-        # Decrypt the block
-        decrypted_block, err, block_log = decrypt(block, key_hex)
-        if err:
-            return None, f"Error in block {i+1}: {err}", log
-            
-        log.append("Block decryption log:")
-        log.extend("  " + line for line in block_log)
-        
-        # XOR with previous ciphertext (or IV for first block)
-        plain_block = "{:04X}".format(int(decrypted_block, 16) ^ int(previous_block, 16))
-        log.append(f"After XOR with previous block: {plain_block}")
+    for i in range(len(ciphertext) // 4):
+        block = ciphertext[4*i:4*i+4]
+        try:
+            block_value = hex_to_int(block)
+            if round_keys is None:
+                round_keys = key_expansion(hex_to_nibbles(key_hex))[0]
+        except ValueError as e:
+            log.tail += [f"\nProcessing Block {i+1}", f"Encrypted Block: {block}",
+                         f"Previous Block (IV for first block): {previous_block}"]
+            return None, f"Error in block {i+1}: {e}", log
         
-        plaintext_blocks.append(plain_block)
+        # Decrypt the block, then XOR with previous ciphertext (or IV for first block)
+        decrypted_block = log.record_block(block_value, round_keys)
+        plaintext_blocks.append(decrypted_block ^ hex_to_int(previous_block))
         previous_block = block
     
-    final_plaintext = "".join(plaintext_blocks)
-    log.append(f"\nFinal plaintext: {final_plaintext}")
-    return final_plaintext, None, log
+    log.finished = True
+    return blocks_to_hex(plaintext_blocks), None, log
+
+def _feedback_mode_traced(cipher_mode, text_hex, key_hex, iv_hex, decrypt_mode):
+    # CTR, OFB and CFB all XOR each block with the encryption of a feed block;
+    # they only differ in where the feed block comes from
+    log = ExecutionTrace(cipher_mode, decrypt_mode, key_hex, iv_hex)
+    log.header += [f"--- {cipher_mode} Mode {'Decryption' if decrypt_mode else 'Encryption'} ---", f"IV: {iv_hex}"]
+
+    if len(text_hex) % 4 != 0:
+        label = "Ciphertext length (excluding IV)" if decrypt_mode else "Plaintext length"
+        return None, f"{label} must be a multiple of 4 hex characters (16-bit blocks)", log
+    log.split_blocks(text_hex)
+
+    try:
+        iv = hex_to_int(iv_hex)
+    except ValueError as e:
+        return None, f"Invalid IV: {e}", log
+
+    feed_block = iv
+    round_keys = None
+    output_blocks = array('H')
+    for i in range(len(text_hex) // 4):
+        block = text_hex[4*i:4*i+4]
+        block_lines = [f"\nProcessing Block {i+1}", f"{'Encrypted Block' if decrypt_mode else 'Current Block'}: {block}"]
+        try:
+            block_value = hex_to_int(block)
+        except ValueError as e:
+            log.tail += block_lines
+            return None, f"Error in block {i+1}: {e}", log
+
+        if cipher_mode == "CTR":
+            # Counter block = IV + block index (mod 2^16)
+            feed_block = (iv + i) & 0xFFFF
+        try:
+            if round_keys is None:
+                round_keys = key_expansion(hex_to_nibbles(key_hex))[0]
+        except ValueError as e:
+            log.tail += block_lines + [log._feed_line(i, feed_block)]
+            return None, f"Error in block {i+1}: {e}", log
+
+        # Keystream block = encryption of the feed block
+        keystream_block = log.record_block(feed_block, round_keys)
+        output_value = block_value ^ keystream_block
+        output_blocks.append(output_value)
+
+        if cipher_mode == "OFB":
+            feed_block = keystream_block
+        elif cipher_mode == "CFB":
+            feed_block = block_value if decrypt_mode else output_value
 
-def export_to_csv(mode, cipher_mode, input_text, key, iv, output, log, filename=None):
+    log.finished = True
+    if decrypt_mode:
+        return blocks_to_hex(output_blocks), None, log
+    return iv_hex + blocks_to_hex(output_blocks), None, log
+
+def _encrypt_feedback_mode(cipher_mode, plaintext_hex, key_hex, iv_hex, trace, engine):
+    if not iv_hex:
+        iv_hex = generate_iv()
+    if not trace:
+        return _run_fast(key_hex, engine, f"encrypt_{cipher_mode.lower()}", plaintext_hex, iv_hex)
+    return _feedback_mode_traced(cipher_mode, plaintext_hex, key_hex, iv_hex, False)
+
+def _decrypt_feedback_mode(cipher_mode, ciphertext_hex, key_hex, trace, engine):
+    if not trace:
+        return _run_fast(key_hex, engine, f"decrypt_{cipher_mode.lower()}", ciphertext_hex)
+    if len(ciphertext_hex) < 8:
+        log = ExecutionTrace(cipher_mode, True, key_hex)
+        log.header.append(f"--- {cipher_mode} Mode Decryption ---")
+        return None, "Ciphertext too short. Need at least IV (4 chars) + one block (4 chars)", log
+    return _feedback_mode_traced(cipher_mode, ciphertext_hex[4:], key_hex, ciphertext_hex[:4], True)
+
+def encrypt_ctr(plaintext_hex, key_hex, iv_hex=None, trace=False, engine=DEFAULT_ENGINE):
+    """
+    Encrypt using CTR mode.
+    Block i is XORed with the encryption of the counter block (IV + i) mod 2^16.
+    plaintext_hex must be a multiple of 4 hex characters (16-bit blocks); the
+    result is IV + ciphertext blocks, like encrypt_cbc().
+    With trace=False the returned log is empty (engine picks the block engine);
+    pass trace=True for the detailed process log.
+    """
+    return _encrypt_feedback_mode("CTR", plaintext_hex, key_hex, iv_hex, trace, engine)
+
+def decrypt_ctr(ciphertext_hex, key_hex, trace=False, engine=DEFAULT_ENGINE):
+    """
+    Decrypt using CTR mode.
+    First 4 characters of ciphertext_hex are the IV.
+    With trace=False the returned log is empty (engine picks the block engine);
+    pass trace=True for the detailed process log.
+    """
+    return _decrypt_feedback_mode("CTR", ciphertext_hex, key_hex, trace, engine)
+
+def encrypt_ofb(plaintext_hex, key_hex, iv_hex=None, trace=False, engine=DEFAULT_ENGINE):
+    """
+    Encrypt using OFB mode.
+    The keystream is E(IV), E(E(IV)), ...; with 16-bit blocks it repeats after at
+    most 65536 blocks, so the whole cycle is computed once and cached per key and IV.
+    A message of up to OFB_DIRECT_BLOCKS blocks under an IV not seen before gets its
+    keystream computed block by block instead; the cycle is built when the key and
+    IV come up again.
+    Result is IV + ciphertext blocks. trace and engine work as in encrypt_cbc().
+    """
+    return _encrypt_feedback_mode("OFB", plaintext_hex, key_hex, iv_hex, trace, engine)
+
+def decrypt_ofb(ciphertext_hex, key_hex, trace=False, engine=DEFAULT_ENGINE):
+    """
+    Decrypt using OFB mode.
+    First 4 characters of ciphertext_hex are the IV.
+    """
+    return _decrypt_feedback_mode("OFB", ciphertext_hex, key_hex, trace, engine)
+
+def encrypt_cfb(plaintext_hex, key_hex, iv_hex=None, trace=False, engine=DEFAULT_ENGINE):
+    """
+    Encrypt using CFB mode (full 16-bit feedback).
+    Each ciphertext block is the plaintext block XOR the encryption of the
+    previous ciphertext block (IV for the first block).
+    Result is IV + ciphertext blocks. trace and engine work as in encrypt_cbc().
+    """
+    return _encrypt_feedback_mode("CFB", plaintext_hex, key_hex, iv_hex, trace, engine)
+
+def decrypt_cfb(ciphertext_hex, key_hex, trace=False, engine=DEFAULT_ENGINE):
+    """
+    Decrypt using CFB mode.
+    First 4 characters of ciphertext_hex are the IV.
+    """
+    return _decrypt_feedback_mode("CFB", ciphertext_hex, key_hex, trace, engine)
+
+def cbc_mac(message_hex, key_hex, engine=DEFAULT_ENGINE):
+    """
+    CBC-MAC tag (4 hex characters) of a hex message, see CBCMAC.
+    message_hex must be a whole number of bytes. Returns (tag, error, log) like the
+    cipher functions; the log is always empty.
+    """
+    try:
+        return MiniAES(key_hex, engine).mac_bytes(hex_to_bytes(message_hex)).hex().upper(), None, []
+    except ValueError as e:
+        return None, str(e), []
+
+def verify_cbc_macs(messages_hex, tags_hex, key_hex, engine=DEFAULT_ENGINE):
+    """
+    Batch-verify hex messages against hex tags under one key.
+    Returns a list of bools; a malformed message or tag counts as a mismatch.
+    """
+    cipher = MiniAES(key_hex, engine)
+    results = []
+    for message_hex, tag_hex in zip(messages_hex, tags_hex):
+        try:
+            results.append(hmac.compare_digest(cipher.mac_bytes(hex_to_bytes(message_hex)), hex_to_bytes(tag_hex)))
+        except ValueError:
+            results.append(False)
+    return results
+
+def encrypt_double(plaintext_hex, key1_hex, key2_hex, engine=DEFAULT_ENGINE):
+    """
+    ECB encryption with double Mini-AES (key1, then key2).
+    Returns (result, error, log); the log is always empty.
+    """
+    try:
+        return DoubleMiniAES(key1_hex, key2_hex, engine).encrypt_ecb(plaintext_hex), None, []
+    except ValueError as e:
+        return None, str(e), []
+
+def decrypt_double(ciphertext_hex, key1_hex, key2_hex, engine=DEFAULT_ENGINE):
+    """Inverse of encrypt_double()."""
+    try:
+        return DoubleMiniAES(key1_hex, key2_hex, engine).decrypt_ecb(ciphertext_hex), None, []
+    except ValueError as e:
+        return None, str(e), []
+
+def _process_file(src_path, dst_path, key_hex, cipher_mode, decrypt, iv_hex, chunk_size, use_mmap, engine):
+    cipher = MiniAES(key_hex, engine)
+    iv = hex_to_int(iv_hex) if iv_hex else None
+    # validate before dst is created so a bad input doesn't leave a partial file
+    context = cipher.decryptor(cipher_mode) if decrypt else cipher.encryptor(cipher_mode, iv)
+    if context.cipher_mode not in _PARTIAL_BLOCK_MODES and os.path.getsize(src_path) % 2 != 0:
+        raise ValueError("File length must be a multiple of 2 bytes (16-bit blocks)")
+    with open(src_path, 'rb') as src, open(dst_path, 'wb') as dst:
+        return cipher._process_stream(context, src, dst, chunk_size, use_mmap)
+
+def encrypt_file(src_path, dst_path, key_hex, cipher_mode="ECB", iv_hex=None,
+                 chunk_size=STREAM_CHUNK_SIZE, use_mmap=False, engine=DEFAULT_ENGINE):
+    """
+    Encrypt a binary file in any of CIPHER_MODES with bounded memory.
+    Except in CTR and OFB mode the file length must be a multiple of 2 bytes.
+    Modes with an IV write it first, like encrypt_cbc(). Raises ValueError on bad input.
+    Returns the number of bytes written.
+    """
+    return _process_file(src_path, dst_path, key_hex, cipher_mode, False, iv_hex, chunk_size, use_mmap, engine)
+
+def decrypt_file(src_path, dst_path, key_hex, cipher_mode="ECB",
+                 chunk_size=STREAM_CHUNK_SIZE, use_mmap=False, engine=DEFAULT_ENGINE):
+    """Decrypt a file written by encrypt_file(). Returns the number of bytes written."""
+    return _process_file(src_path, dst_path, key_hex, cipher_mode, True, None, chunk_size, use_mmap, engine)
+
+# gzip magic number, used to recognise compressed exports on import
+_GZIP_MAGIC = b"\x1f\x8b"
+
+def _open_csv(filepath, mode, compress=None):
+    # text-mode file for the csv module, gzip-compressed when compress is set
+    # or (when reading) when the file starts with the gzip magic number
+    if compress is None:
+        with open(filepath, 'rb') as f:
+            compress = f.read(2) == _GZIP_MAGIC
+    if compress:
+        return gzip.open(filepath, mode + 't', newline='')
+    return open(filepath, mode, newline='')
+
+def export_to_csv(mode, cipher_mode, input_text, key, iv, output, log, filename=None, compress=False):
     """
     Export encryption/decryption operation details to a CSV file.
     Args:
@@ -491,18 +1988,22 @@ def export_to_csv(mode, cipher_mode, input_text, key, iv, output, log, filename=
         key (str): Encryption/decryption key
         iv (str): Initialization vector (for CBC mode)
         output (str): Output text (ciphertext or plaintext)
-        log (list): Process log
+        log (iterable): Process log lines (a list, an ExecutionTrace or a generator);
+            lines are written as they are produced, never collected in memory
         filename (str, optional): Custom filename. If None, generates timestamp-based name
+        compress (bool): Write the file gzip-compressed (".gz" is appended to the name)
     """
     if not filename:
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         filename = f"mini_aes_{mode.lower()}_{cipher_mode.lower()}_{timestamp}.csv"
+    if compress and not filename.endswith(".gz"):
+        filename += ".gz"
     
     # Create 'logs' directory if it doesn't exist
     os.makedirs('logs', exist_ok=True)
     filepath = os.path.join('logs', filename)
     
-    with open(filepath, 'w', newline='') as csvfile:
+    with _open_csv(filepath, 'w', compress) as csvfile:
         writer = csv.writer(csvfile)
         # Write operation details
         writer.writerow(['Operation Type', mode])
@@ -514,45 +2015,288 @@ def export_to_csv(mode, cipher_mode, input_text, key, iv, output, log, filename=
         writer.writerow(['Output', output])
         writer.writerow([])  # Empty row as separator
         writer.writerow(['Process Log'])
-        for line in log:
-            writer.writerow([line])
+        writer.writerows([line] for line in log)
     
     return filepath
 
+class CSVProcessLog:
+    """
+    The process log of an exported CSV file, read lazily: every iteration
+    reopens the file and yields the log lines one at a time, so large exports
+    are never held in memory. lines(start, stop) yields a range of lines.
+    """
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+
+    def __iter__(self):
+        with _open_csv(self.filepath, 'r') as csvfile:
+            reader = csv.reader(csvfile)
+            for row in reader:
+                if row and row[0] == 'Process Log':
+                    break
+            for row in reader:
+                if row:
+                    yield row[0]
+
+    def lines(self, start=0, stop=None):
+        return itertools.islice(self, start, stop)
+
+    def __repr__(self):
+        return f"<CSVProcessLog {self.filepath}>"
+
 def import_from_csv(filepath):
     """
-    Import encryption/decryption operation details from a CSV file.
+    Import encryption/decryption operation details from a CSV file (plain or
+    gzip-compressed, as written by export_to_csv()).
     Returns:
-        dict: Dictionary containing operation details and log
+        dict: Dictionary containing operation details; the fields before the
+        log are read right away, 'Process Log' is a CSVProcessLog that reads
+        the log lines only when iterated
     """
     try:
-        with open(filepath, 'r', newline='') as csvfile:
+        with _open_csv(filepath, 'r') as csvfile:
             reader = csv.reader(csvfile)
             
-            # Read operation details
+            # Read operation details, stopping at the log
             operation = {}
-            log_started = False
-            log_lines = []
-            
             for row in reader:
                 if not row:  # Skip empty rows
                     continue
                 
                 if row[0] == 'Process Log':
-                    log_started = True
-                    continue
+                    break
                 
-                if log_started:
-                    log_lines.append(row[0])
-                else:
-                    operation[row[0]] = row[1]
+                operation[row[0]] = row[1]
             
-            operation['Process Log'] = log_lines
+            operation['Process Log'] = CSVProcessLog(filepath)
             return operation
             
     except Exception as e:
         return None, f"Error reading CSV file: {str(e)}"
 
+# binary trace files
+# A fixed little-endian header (TRACE_HEADER, which also holds the operation
+# parameters: mode, key and IV) and the round keys, then one fixed-size record
+# per block (the STATES_PER_BLOCK states of ExecutionTrace), then 4 ASCII
+# characters per block of input text, the input and output texts and a short
+# JSON section with the non-block log lines. Block n is found by arithmetic on
+# the header fields, so TraceFile maps the file and reads one block without
+# touching the rest.
+TRACE_MAGIC = b"MINIAEST"
+TRACE_VERSION = 2
+# magic, version, flags, cipher mode (index in CIPHER_MODES), states per block,
+# block count, text length, input length, output length, metadata length,
+# then mode (e.g. "Encrypt"), key and IV as NUL-padded ASCII
+TRACE_HEADER = struct.Struct("<8sBBBBQQQQI8s4s4s")
+
+_TRACE_DECRYPT = 0x01
+_TRACE_FINISHED = 0x02
+_TRACE_SPLIT = 0x04 # the input was split into blocks (text section holds it)
+_TRACE_UTF8_TEXT = 0x08 # text is not plain ASCII, so it is not indexed per block
+_TRACE_IV = 0x10 # the IV field is set
+
+def _header_field(value, size, name):
+    # value as NUL-padded ASCII of at most size characters
+    data = value.encode('ascii', 'replace')
+    if len(data) > size or not value.isascii() or "\0" in value:
+        raise ValueError(f"{name} {value!r} does not fit a trace file header ({size} ASCII characters)")
+    return data
+
+def _header_text(data):
+    return str(data.rstrip(b"\0"), 'ascii')
+
+_ROUND_KEYS_STRUCT = struct.Struct(f"<{NUM_ROUNDS + 1}H")
+
+def _little_endian_bytes(values):
+    if _NATIVE_LITTLE_ENDIAN:
+        return memoryview(values).cast('B')
+    values = array('H', values)
+    values.byteswap()
+    return values.tobytes()
+
+def export_to_binary(mode, cipher_mode, input_text, key, iv, output, log, filename=None):
+    """
+    Export an operation to a binary trace file, a compact alternative to
+    export_to_csv() with the same arguments. log must be the ExecutionTrace of a
+    traced call; its round states are stored as fixed-size records so that
+    TraceFile can read the trace of any block directly.
+    Returns the path of the written file. Raises ValueError if log is not an
+    ExecutionTrace, or if mode (8), the key or the IV (4) is longer than its
+    ASCII header field.
+    """
+    if not isinstance(log, ExecutionTrace) or log._range is not None:
+        raise ValueError("Binary export needs the complete ExecutionTrace of a traced call")
+    iv = log.iv_hex if log.iv_hex is not None else iv
+    fields = (_header_field(mode, 8, "Mode"), _header_field(log.key_hex, 4, "Key"),
+              _header_field(iv or "", 4, "IV"))
+    if not filename:
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        filename = f"mini_aes_{mode.lower()}_{cipher_mode.lower()}_{timestamp}.trace"
+
+    os.makedirs('logs', exist_ok=True)
+    filepath = os.path.join('logs', filename)
+
+    flags = _TRACE_DECRYPT if log.decrypt else 0
+    flags |= _TRACE_FINISHED if log.finished else 0
+    flags |= _TRACE_IV if iv is not None else 0
+    text = b""
+    if log.text_hex is not None:
+        flags |= _TRACE_SPLIT
+        text = log.text_hex.encode('utf-8')
+        if len(text) != len(log.text_hex):
+            flags |= _TRACE_UTF8_TEXT
+    input_bytes, output_bytes = (input_text or "").encode('utf-8'), (output or "").encode('utf-8')
+    metadata = json.dumps({'header': log.header, 'tail': log.tail}).encode('utf-8')
+    round_keys = list(log.round_keys) or [0] * (NUM_ROUNDS + 1)
+
+    with open(filepath, 'wb') as f:
+        f.write(TRACE_HEADER.pack(TRACE_MAGIC, TRACE_VERSION, flags, CIPHER_MODES.index(log.cipher_mode),
+                                  ExecutionTrace.STATES_PER_BLOCK, log.block_count, len(text),
+                                  len(input_bytes), len(output_bytes), len(metadata), *fields))
+        f.write(_ROUND_KEYS_STRUCT.pack(*round_keys))
+        f.write(_little_endian_bytes(log.states))
+        for data in (text, input_bytes, output_bytes, metadata):
+            f.write(data)
+    return filepath
+
+class TraceFile:
+    """
+    Memory-mapped reader for files written by export_to_binary(). The header is
+    read on open; block(n) and block_log(n) read only the record of block n, and
+    trace is an ExecutionTrace over the mapped records (blocks(start, stop) on it
+    renders a range). Raises ValueError if the file is not a trace file.
+    """
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        with open(filepath, 'rb') as f:
+            try:
+                self._mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError: # empty file
+                raise ValueError(f"{filepath} is not a Mini-AES trace file") from None
+        try:
+            self._parse()
+        except Exception:
+            self._mapped.close()
+            raise
+
+    def _parse(self):
+        mapped = self._mapped
+        if len(mapped) < TRACE_HEADER.size + _ROUND_KEYS_STRUCT.size or mapped[:len(TRACE_MAGIC)] != TRACE_MAGIC:
+            raise ValueError(f"{self.filepath} is not a Mini-AES trace file")
+        (_, version, flags, cipher_mode, states_per_block, block_count, text_length, input_length,
+         output_length, metadata_length, mode, key, iv) = TRACE_HEADER.unpack_from(mapped)
+        if version != TRACE_VERSION or states_per_block != ExecutionTrace.STATES_PER_BLOCK:
+            raise ValueError(f"Unsupported trace file version {version}")
+        offset = TRACE_HEADER.size
+        round_keys = _ROUND_KEYS_STRUCT.unpack_from(mapped, offset)
+        offset += _ROUND_KEYS_STRUCT.size
+        sections = []
+        for length in (block_count * states_per_block * 2, text_length, input_length, output_length, metadata_length):
+            sections.append((offset, offset + length))
+            offset += length
+        if offset != len(mapped):
+            raise ValueError(f"Trace file {self.filepath} is truncated or corrupt")
+        (states, text, self._input, self._output, metadata) = sections
+        metadata = json.loads(mapped[slice(*metadata)])
+
+        view = memoryview(mapped)
+        self._views = [view]
+        if _NATIVE_LITTLE_ENDIAN:
+            states = view[slice(*states)].cast('H')
+            self._views.append(states)
+        else:
+            states = array('H', view[slice(*states)])
+            states.byteswap()
+        if flags & _TRACE_UTF8_TEXT:
+            text = str(mapped[slice(*text)], 'utf-8')
+        else:
+            text = view[slice(*text)]
+            self._views.append(text)
+
+        self.mode = _header_text(mode)
+        self.cipher_mode = CIPHER_MODES[cipher_mode]
+        self.key = _header_text(key)
+        self.iv = _header_text(iv) if flags & _TRACE_IV else None
+        self.block_count = block_count
+        trace = ExecutionTrace(self.cipher_mode, bool(flags & _TRACE_DECRYPT), self.key, self.iv)
+        trace.header = metadata['header']
+        trace.tail = metadata['tail']
+        trace.finished = bool(flags & _TRACE_FINISHED)
+        if flags & _TRACE_SPLIT:
+            trace.split_blocks(text)
+        if block_count:
+            trace.round_keys.extend(round_keys)
+        trace.states = states
+        self.trace = trace
+
+    @property
+    def input_text(self):
+        return str(self._mapped[slice(*self._input)], 'utf-8')
+
+    @property
+    def output(self):
+        return str(self._mapped[slice(*self._output)], 'utf-8')
+
+    def block(self, index):
+        """(block text, block cipher input, round states) of block index."""
+        if not -self.block_count <= index < self.block_count:
+            raise IndexError("block index out of range")
+        index %= self.block_count
+        cipher_input, states = self.trace.block_states(index)
+        return self.trace._block_text(index), cipher_input, list(states)
+
+    def block_log(self, index):
+        """The process log lines of block index."""
+        self.block(index) # range check
+        return list(self.trace.blocks(index % self.block_count, index % self.block_count + 1))
+
+    def close(self):
+        """Unmap the file; trace can no longer be read afterwards."""
+        for view in reversed(self._views):
+            view.release()
+        self._mapped.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __repr__(self):
+        return f"<TraceFile {self.filepath}: {self.cipher_mode} {self.mode}, {self.block_count} blocks>"
+
+def import_from_binary(filepath):
+    """
+    Import operation details from a binary trace file, like import_from_csv().
+    Returns:
+        dict: Dictionary containing operation details; 'Process Log' is the
+        ExecutionTrace read from the memory-mapped file and 'Trace File' the
+        open TraceFile, to be closed once the log is no longer needed
+    """
+    try:
+        trace_file = TraceFile(filepath)
+        try:
+            operation = {
+                'Operation Type': trace_file.mode,
+                'Cipher Mode': trace_file.cipher_mode,
+                'Input Text': trace_file.input_text,
+                'Key': trace_file.key,
+            }
+            if trace_file.iv:
+                operation['IV'] = trace_file.iv
+            operation['Output'] = trace_file.output
+        except Exception:
+            trace_file.close()
+            raise
+        operation['Process Log'] = trace_file.trace
+        operation['Trace File'] = trace_file
+        return operation
+
+    except Exception as e:
+        return None, f"Error reading trace file: {str(e)}"
+
 # Update test cases
 if __name__ == "__main__":
     print("--- Mini-AES Test Cases ---")
@@ -565,7 +2309,7 @@ if __name__ == "__main__":
     print(f"\nTest Case 1:")
     print(f"Plaintext: {plaintext1}")
     print(f"Key: {key1}")
-    ciphertext1, err1_enc, log1_enc = encrypt(plaintext1, key1)
+    ciphertext1, err1_enc, log1_enc = encrypt(plaintext1, key1, trace=True)
     if err1_enc:
         print(f"Encryption Error: {err1_enc}")
     else:
@@ -575,7 +2319,7 @@ if __name__ == "__main__":
 
         # Dekripsi
         print(f"\n--- Starting Decryption for Test Case 1 ---")
-        decrypted1, err1_dec, log1_dec = decrypt(ciphertext1, key1)
+        decrypted1, err1_dec, log1_dec = decrypt(ciphertext1, key1, trace=True)
         if err1_dec:
             print(f"Decryption Error: {err1_dec}")
         else:
@@ -592,14 +2336,14 @@ if __name__ == "__main__":
     print(f"\n\n{'='*20} Test Case 2 {'='*20}")
     print(f"Plaintext: {plaintext2}")
     print(f"Key: {key2}")
-    ciphertext2, err2_enc, log2_enc = encrypt(plaintext2, key2)
+    ciphertext2, err2_enc, log2_enc = encrypt(plaintext2, key2, trace=True)
     if err2_enc: print(f"Encryption Error: {err2_enc}")
     else:
         print(f"Calculated Ciphertext: {ciphertext2}")
         print("\n--- Encryption Log ---")
         for line in log2_enc: print(line)
         print(f"\n--- Starting Decryption for Test Case 2 ---")
-        decrypted2, err2_dec, log2_dec = decrypt(ciphertext2, key2)
+        decrypted2, err2_dec, log2_dec = decrypt(ciphertext2, key2, trace=True)
         if err2_dec: print(f"Decryption Error: {err2_dec}")
         else:
             print(f"\nDecrypted Plaintext: {decrypted2}")
@@ -614,14 +2358,14 @@ if __name__ == "__main__":
     print(f"\n\n{'='*20} Test Case 3 {'='*20}")
     print(f"Plaintext: {plaintext3}")
     print(f"Key: {key3}")
-    ciphertext3, err3_enc, log3_enc = encrypt(plaintext3, key3)
+    ciphertext3, err3_enc, log3_enc = encrypt(plaintext3, key3, trace=True)
     if err3_enc: print(f"Encryption Error: {err3_enc}")
     else:
         print(f"Calculated Ciphertext: {ciphertext3}")
         print("\n--- Encryption Log ---")
         for line in log3_enc: print(line)
         print(f"\n--- Starting Decryption for Test Case 3 ---")
-        decrypted3, err3_dec, log3_dec = decrypt(ciphertext3, key3)
+        decrypted3, err3_dec, log3_dec = decrypt(ciphertext3, key3, trace=True)
         if err3_dec: print(f"Decryption Error: {err3_dec}")
         else:
             print(f"\nDecrypted Plaintext: {decrypted3}")
@@ -639,7 +2383,7 @@ if __name__ == "__main__":
     print(f"Plaintext: {plaintext}")
     print(f"Key: {key}")
     
-    ciphertext, err_enc, log_enc = encrypt(plaintext, key)
+    ciphertext, err_enc, log_enc = encrypt(plaintext, key, trace=True)
     if err_enc:
         print(f"ECB Encryption Error: {err_enc}")
     else:
@@ -648,7 +2392,7 @@ if __name__ == "__main__":
         for line in log_enc: print(line)
         
         print(f"\nMulti-Block ECB Decryption Test:")
-        decrypted, err_dec, log_dec = decrypt(ciphertext, key)
+        decrypted, err_dec, log_dec = decrypt(ciphertext, key, trace=True)
         if err_dec:
             print(f"ECB Decryption Error: {err_dec}")
         else:
@@ -0,0 +1,108 @@
+import functools
+import random
+
+import numpy as np
+
+from mini_aes import NUM_ROUNDS, S_BOX
+from mini_aes_attacks import expand_keys_array
+from mini_aes_numpy import column_sub_table, sub_nibbles, shift_rows, mix_columns
+
+# Differential and linear analysis of the S-box and of the (reduced-round)
+# cipher. S-boxes can be given as a dict like S_BOX or as a sequence of 16
+# nibbles, so variants can be assessed; the key schedule uses the same S-box.
+# Results are cached and come back as read-only NumPy arrays.
+
+# number of cached output-difference distributions
+DISTRIBUTION_CACHE_SIZE = 32
+
+_NIBBLES = np.arange(16)
+_PARITY = np.array([bin(v).count("1") & 1 for v in range(16)])
+
+def _as_sbox(sbox):
+    table = tuple(sbox[n] for n in range(16))
+    if sorted(table) != list(range(16)):
+        raise ValueError("S-box must be a permutation of the 16 nibbles")
+    return table
+
+def _readonly(values):
+    values.flags.writeable = False
+    return values
+
+@functools.lru_cache(maxsize=None)
+def _ddt(sbox):
+    table = np.array(sbox)
+    # row dx, entry x: S(x) ^ S(x ^ dx)
+    output_differences = table[_NIBBLES] ^ table[_NIBBLES ^ _NIBBLES[:, None]]
+    cells = 16 * _NIBBLES[:, None] + output_differences
+    return _readonly(np.bincount(cells.ravel(), minlength=256).reshape(16, 16))
+
+@functools.lru_cache(maxsize=None)
+def _lat(sbox):
+    table = np.array(sbox)
+    # [a, b, x]: parity of a.x ^ b.S(x)
+    parity = _PARITY[_NIBBLES[:, None, None] & _NIBBLES] ^ _PARITY[_NIBBLES[None, :, None] & table]
+    return _readonly(8 - parity.sum(axis=2))
+
+def difference_distribution_table(sbox=S_BOX):
+    """DDT[dx, dy]: number of inputs x with S(x) ^ S(x ^ dx) == dy."""
+    return _ddt(_as_sbox(sbox))
+
+def linear_approximation_table(sbox=S_BOX):
+    """LAT[a, b]: number of inputs x with a.x == b.S(x), minus 8 (the bias times 16)."""
+    return _lat(_as_sbox(sbox))
+
+def inverse_sbox(sbox):
+    """The inverse of an S-box, as a tuple of 16 nibbles."""
+    table = _as_sbox(sbox)
+    return tuple(table.index(n) for n in range(16))
+
+def sample_keys(count=16, seed=None):
+    """count distinct random 16-bit keys; pass seed for a reproducible sample."""
+    return random.Random(seed).sample(range(1 << 16), count)
+
+@functools.lru_cache(maxsize=None)
+def _round_tables(sbox):
+    # key-independent part of a full round and of the final round, like
+    # ROUND_TABLE/FINAL_ROUND_TABLE in mini_aes_numpy
+    all_blocks = np.arange(0x10000, dtype=np.uint16)
+    after_shift = shift_rows(sub_nibbles(all_blocks, column_sub_table(sbox)))
+    return mix_columns(after_shift), after_shift
+
+def encrypt_rounds(blocks, keys, rounds=NUM_ROUNDS, sbox=S_BOX):
+    """
+    The first rounds rounds of Mini-AES on blocks, for every key at once.
+    Returns a (len(keys), len(blocks)) uint16 array. Round NUM_ROUNDS is the
+    final round (no MixColumns); earlier rounds are full rounds.
+    """
+    if not 1 <= rounds <= NUM_ROUNDS:
+        raise ValueError(f"rounds must be between 1 and {NUM_ROUNDS}")
+    sbox = _as_sbox(sbox)
+    round_table, final_round_table = _round_tables(sbox)
+    keys = np.asarray(keys, dtype=np.uint16)
+    round_keys = [rk[:, None] for rk in expand_keys_array(keys, sbox)]
+    state = np.asarray(blocks, dtype=np.uint16)[None, :] ^ round_keys[0]
+    for r in range(1, rounds + 1):
+        state = (final_round_table if r == NUM_ROUNDS else round_table)[state] ^ round_keys[r]
+    return state
+
+@functools.lru_cache(maxsize=DISTRIBUTION_CACHE_SIZE)
+def _output_difference_distribution(input_difference, keys, rounds, sbox):
+    blocks = np.arange(0x10000, dtype=np.uint16)
+    output_differences = (encrypt_rounds(blocks, keys, rounds, sbox)
+                          ^ encrypt_rounds(blocks ^ np.uint16(input_difference), keys, rounds, sbox))
+    return _readonly(np.bincount(output_differences.ravel(), minlength=0x10000))
+
+def output_difference_distribution(input_difference, keys, rounds=NUM_ROUNDS, sbox=S_BOX):
+    """
+    Empirical output-difference distribution of the first rounds rounds over all
+    2^16 input pairs (x, x ^ input_difference), summed over keys.
+    Returns a 65536-entry count array indexed by output difference.
+    """
+    if not 0 <= input_difference <= 0xFFFF:
+        raise ValueError("Input difference must be a 16-bit value")
+    return _output_difference_distribution(input_difference, tuple(keys), rounds, _as_sbox(sbox))
+
+def set_distribution_cache_size(maxsize):
+    """Replace the output-difference distribution cache with an empty one holding at most maxsize results."""
+    global _output_difference_distribution
+    _output_difference_distribution = functools.lru_cache(maxsize=maxsize)(_output_difference_distribution.__wrapped__)
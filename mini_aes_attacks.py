@@ -0,0 +1,179 @@
+import functools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import mini_aes
+from mini_aes import NUM_ROUNDS, RCON, S_BOX
+from mini_aes_numpy import encrypt_array, decrypt_array
+
+# Known-plaintext attacks. The key space is only 2^16, so every key is tried:
+# key expansion runs on a uint16 array holding all candidate keys at once and
+# the cipher runs on per-key round key arrays (see mini_aes_numpy.encrypt_array).
+# Double Mini-AES falls to a meet-in-the-middle attack in about 2 * 2^16
+# encryptions instead of 2^32.
+
+KEY_SPACE = 1 << 16
+
+# keys per worker task
+SHARD_KEYS = 1 << 14
+
+@functools.lru_cache(maxsize=None)
+def _g_table(sbox):
+    # G function of the key schedule on one word (byte): RotWord then SubWord
+    return np.array([(sbox[w & 0xF] << 4) | sbox[w >> 4] for w in range(256)], dtype=np.uint16)
+
+def expand_keys_array(keys, sbox=S_BOX):
+    """
+    Vectorized expand_key_packed(): keys is an array of 16-bit keys, the result
+    is the round keys RK0..RK3 as uint16 arrays (one entry per key). sbox (a
+    dict like S_BOX or a sequence of 16 nibbles) replaces S_BOX in SubWord.
+    """
+    keys = np.asarray(keys, dtype=np.uint16)
+    g_table = _g_table(tuple(sbox[n] for n in range(16)))
+    w = [keys >> 8, keys & 0xFF]
+    for i in range(2, 2 * (NUM_ROUNDS + 1)):
+        temp = w[i-1]
+        if i % 2 == 0:
+            rcon = RCON[i // 2]
+            temp = g_table[temp] ^ np.uint16((rcon[0] << 4) | rcon[1])
+        w.append(w[i-2] ^ temp)
+    return [(w[i] << 8) | w[i+1] for i in range(0, len(w), 2)]
+
+def _all_keys():
+    return np.arange(KEY_SPACE, dtype=np.uint32).astype(np.uint16)
+
+def _as_blocks(value):
+    # a block as an int, or a hex string of one or more blocks (ECB)
+    if isinstance(value, str):
+        if len(value) % 4 != 0:
+            raise ValueError("Block text must be a multiple of 4 hex characters (16-bit blocks)")
+        return list(mini_aes.blocks_from_buffer(mini_aes.hex_to_bytes(value)))
+    if not 0 <= value <= 0xFFFF:
+        raise ValueError("Block must be a 16-bit value")
+    return [value]
+
+def parse_block_pairs(pairs):
+    """Flatten (plaintext, ciphertext) pairs of ints or hex strings into a list of block pairs."""
+    block_pairs = []
+    for plaintext, ciphertext in pairs:
+        plaintext_blocks, ciphertext_blocks = _as_blocks(plaintext), _as_blocks(ciphertext)
+        if len(plaintext_blocks) != len(ciphertext_blocks):
+            raise ValueError("Plaintext and ciphertext must have the same number of blocks")
+        block_pairs.extend(zip(plaintext_blocks, ciphertext_blocks))
+    if not block_pairs:
+        raise ValueError("Need at least one plaintext/ciphertext pair")
+    return block_pairs
+
+def search_key_range(block_pairs, start=0, stop=KEY_SPACE):
+    """Keys in [start, stop) that encrypt every plaintext block to its ciphertext block."""
+    keys = _all_keys()[start:stop]
+    for plaintext, ciphertext in block_pairs:
+        # each pair only runs on the keys that survived the previous ones
+        keys = keys[encrypt_array(np.uint16(plaintext), expand_keys_array(keys)) == ciphertext]
+        if not len(keys):
+            break
+    return [int(k) for k in keys]
+
+def exhaustive_key_search(pairs, workers=1, shard_keys=SHARD_KEYS):
+    """
+    Try all 65,536 keys against known (plaintext, ciphertext) pairs.
+    pairs are ints (single blocks) or hex strings (ECB, any number of blocks).
+    workers > 1 spreads shards of shard_keys keys over a process pool
+    (None means os.cpu_count()).
+    Returns (keys, stats): the sorted list of consistent keys, and a dict with
+    keys_tested, seconds and keys_per_second. Raises ValueError on bad pairs.
+    """
+    if shard_keys < 1:
+        raise ValueError("shard_keys must be at least 1")
+    block_pairs = parse_block_pairs(pairs)
+    workers = workers or os.cpu_count() or 1
+    started = time.perf_counter()
+    if workers == 1:
+        keys = search_key_range(block_pairs)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(search_key_range, block_pairs, start, min(start + shard_keys, KEY_SPACE))
+                       for start in range(0, KEY_SPACE, shard_keys)]
+            keys = [key for future in futures for key in future.result()]
+    seconds = time.perf_counter() - started
+    stats = {
+        'keys_tested': KEY_SPACE,
+        'seconds': seconds,
+        'keys_per_second': KEY_SPACE / seconds if seconds else float('inf'),
+    }
+    return keys, stats
+
+def build_middle_index(plaintext):
+    """
+    Index of the middle values E_k1(plaintext) over all keys k1, as a counting
+    sort: order lists the keys k1 sorted by middle value, and the keys whose
+    middle value is m are order[starts[m]:starts[m + 1]].
+    """
+    middle = encrypt_array(np.uint16(plaintext), expand_keys_array(_all_keys()))
+    order = np.argsort(middle, kind='stable').astype(np.uint16)
+    starts = np.zeros(KEY_SPACE + 1, dtype=np.uint32)
+    np.cumsum(np.bincount(middle, minlength=KEY_SPACE), out=starts[1:])
+    return order, starts
+
+# index of the worker processes, installed once per process by the pool initializer
+_worker_index = None
+
+def _set_worker_index(order, starts):
+    global _worker_index
+    _worker_index = (order, starts)
+
+def probe_middle_index(block_pairs, order, starts, start=0, stop=KEY_SPACE):
+    """
+    Probe the index with D_k2(ciphertext) for k2 in [start, stop) and check the
+    matching (k1, k2) candidates against every block pair.
+    """
+    key2 = _all_keys()[start:stop]
+    middle = decrypt_array(np.uint16(block_pairs[0][1]), expand_keys_array(key2)).astype(np.int64)
+    first = starts[middle].astype(np.int64)
+    counts = starts[middle + 1] - first
+    # one (k1, k2) row per index hit
+    rows = np.repeat(np.arange(len(key2)), counts)
+    offsets = np.arange(len(rows)) - np.repeat(np.cumsum(counts) - counts, counts)
+    key1, key2 = order[first[rows] + offsets], key2[rows]
+    for plaintext, ciphertext in block_pairs[1:]:
+        match = encrypt_array(encrypt_array(np.uint16(plaintext), expand_keys_array(key1)),
+                              expand_keys_array(key2)) == ciphertext
+        key1, key2 = key1[match], key2[match]
+    return [(int(k1), int(k2)) for k1, k2 in zip(key1, key2)]
+
+def _probe_worker(block_pairs, start, stop):
+    return probe_middle_index(block_pairs, *_worker_index, start, stop)
+
+def meet_in_the_middle(pairs, workers=1, shard_keys=SHARD_KEYS):
+    """
+    Recover (key1, key2) of double Mini-AES (mini_aes.DoubleMiniAES) from known
+    (plaintext, ciphertext) pairs, given like exhaustive_key_search(). The first
+    block pair builds the middle value index, the others filter candidates; with
+    a single pair about 2^16 key pairs remain, 3 pairs usually leave one.
+    Returns (key_pairs, stats) with candidates, seconds and key_pairs_per_second
+    (the 2^32 key pairs covered per second).
+    """
+    if shard_keys < 1:
+        raise ValueError("shard_keys must be at least 1")
+    block_pairs = parse_block_pairs(pairs)
+    workers = workers or os.cpu_count() or 1
+    started = time.perf_counter()
+    order, starts = build_middle_index(block_pairs[0][0])
+    if workers == 1:
+        key_pairs = probe_middle_index(block_pairs, order, starts)
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_set_worker_index,
+                                 initargs=(order, starts)) as pool:
+            futures = [pool.submit(_probe_worker, block_pairs, start, min(start + shard_keys, KEY_SPACE))
+                       for start in range(0, KEY_SPACE, shard_keys)]
+            key_pairs = [pair for future in futures for pair in future.result()]
+    seconds = time.perf_counter() - started
+    stats = {
+        'candidates': len(key_pairs),
+        'seconds': seconds,
+        'key_pairs_per_second': KEY_SPACE * KEY_SPACE / seconds if seconds else float('inf'),
+    }
+    return sorted(key_pairs), stats
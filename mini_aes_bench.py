@@ -0,0 +1,222 @@
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import mini_aes
+
+# Benchmarks for every entry point, engine and input size, with JSON output.
+# Each case runs in a fresh worker process so its peak RSS is its own; the
+# timed call is repeated (after one warm-up call) until MIN_TIME has passed and
+# the fastest run counts.
+# Inputs are generated from a fixed seed, so runs are comparable.
+
+KEY = "A73B"
+IV = "1234"
+SEED = 2024
+
+# input sizes in bytes (2 bytes = 1 block)
+SIZES = (2, 1 << 10, 1 << 20)
+FULL_SIZES = SIZES + (100 * 10**6,)
+
+# the traced path builds a log of ~30 lines per block, so it only runs on small inputs
+TRACE_MAX_BYTES = 1 << 12
+
+# seconds of repeated runs per case
+MIN_TIME = 0.2
+
+# slowdown (fraction of the baseline ns/block) that compare() reports as a regression
+REGRESSION_THRESHOLD = 0.10
+
+GROUPS = ("key_expansion", "encrypt", "decrypt", "encrypt_cbc", "decrypt_cbc",
+          "ecb_bytes", "cbc_bytes", "export_csv", "import_csv")
+
+def _input_hex(size):
+    return random.Random(SEED).randbytes(size).hex().upper()
+
+def _reading_log(call):
+    # the trace log renders its lines lazily, so iterate it to time the full traced call
+    return lambda: sum(1 for _ in call()[2])
+
+def _build(group, engine, trace, size):
+    # returns the timed zero-argument call; inputs are prepared here, untimed
+    if group == "key_expansion":
+        if trace:
+            nibbles = mini_aes.hex_to_nibbles(KEY)
+            return lambda: mini_aes.key_expansion(nibbles)
+        key = mini_aes.hex_to_int(KEY)
+        return lambda: mini_aes.expand_key_packed(key)
+    if group in ("encrypt", "encrypt_cbc"):
+        text = _input_hex(size)
+        if group == "encrypt":
+            return _reading_log(lambda: mini_aes.encrypt(text, KEY, trace, engine))
+        return _reading_log(lambda: mini_aes.encrypt_cbc(text, KEY, IV, trace, engine))
+    if group == "decrypt":
+        text = mini_aes.MiniAES(KEY).encrypt_ecb(_input_hex(size))
+        return _reading_log(lambda: mini_aes.decrypt(text, KEY, trace, engine))
+    if group == "decrypt_cbc":
+        text = mini_aes.MiniAES(KEY).encrypt_cbc(_input_hex(size), IV)
+        return _reading_log(lambda: mini_aes.decrypt_cbc(text, KEY, trace, engine))
+    if group in ("ecb_bytes", "cbc_bytes"):
+        cipher = mini_aes.MiniAES(KEY, engine)
+        data = random.Random(SEED).randbytes(size)
+        out = bytearray(size + 2)
+        if group == "ecb_bytes":
+            return lambda: cipher.encrypt_ecb_bytes(data, out)
+        return lambda: cipher.encrypt_cbc_bytes(data, mini_aes.hex_to_int(IV), out)
+    # export_to_csv writes into logs/ under the working directory, which _measure
+    # points at a temporary directory for these cases
+    text = _input_hex(size)
+    _, _, log = mini_aes.encrypt(text, KEY, trace=True)
+    export = lambda: mini_aes.export_to_csv("Encrypt", "ECB", text, KEY, None, "", log, "bench.csv")
+    if group == "export_csv":
+        return export
+    export()
+    # the log is read lazily, so iterate it to time the full import
+    path = os.path.join("logs", "bench.csv")
+    return lambda: sum(1 for _ in mini_aes.import_from_csv(path)['Process Log'])
+
+def _time(run, min_time):
+    # (best seconds, repeats) of run after one warm-up call
+    run() # warm-up: lazy engine imports and table caches stay out of the timings
+    best, repeats, total = float('inf'), 0, 0.0
+    while total < min_time or repeats == 0:
+        started = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - started
+        best = min(best, elapsed)
+        total += elapsed
+        repeats += 1
+    return best, repeats
+
+def _measure(case, min_time):
+    if case['group'] in ("export_csv", "import_csv"):
+        # the CSV files live in a temporary directory removed after the case
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as workdir:
+            os.chdir(workdir)
+            try:
+                best, repeats = _time(_build(case['group'], case['engine'], case['trace'], case['bytes']), min_time)
+            finally:
+                os.chdir(cwd)
+    else:
+        best, repeats = _time(_build(case['group'], case['engine'], case['trace'], case['bytes']), min_time)
+    blocks = max(1, case['bytes'] // 2)
+    return dict(case, blocks=blocks, repeats=repeats, seconds=best,
+                ns_per_block=best * 1e9 / blocks,
+                mb_per_s=case['bytes'] / best / 1e6 if best else float('inf'),
+                # ru_maxrss is in KiB on Linux and in bytes on macOS
+                peak_rss_bytes=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024))
+
+def case_id(case):
+    trace = "trace" if case['trace'] else "fast"
+    return f"{case['group']}/{case['engine'] or '-'}/{trace}/{case['bytes']}"
+
+def cases(groups=GROUPS, engines=None, sizes=SIZES):
+    """Every benchmark case as a dict: group, engine (None for engine-less cases), trace, bytes."""
+    if engines is None:
+        engines = mini_aes.engine_names()
+    result = []
+    for group in groups:
+        if group == "key_expansion":
+            result += [dict(group=group, engine=None, trace=trace, bytes=2) for trace in (True, False)]
+            continue
+        for size in sizes:
+            if group in ("export_csv", "import_csv"):
+                if size <= TRACE_MAX_BYTES:
+                    result.append(dict(group=group, engine=None, trace=True, bytes=size))
+                continue
+            if group in ("encrypt", "decrypt", "encrypt_cbc", "decrypt_cbc") and size <= TRACE_MAX_BYTES:
+                # the traced path ignores the engine
+                result.append(dict(group=group, engine=None, trace=True, bytes=size))
+            result += [dict(group=group, engine=engine, trace=False, bytes=size) for engine in engines]
+    return result
+
+def run(groups=GROUPS, engines=None, sizes=SIZES, min_time=MIN_TIME, output=None, progress=None):
+    """
+    Run the benchmark cases and return the report dict (meta and results).
+    output, if given, is the JSON file the report is written to. progress, if
+    given, is called with each result as it completes.
+    """
+    results = []
+    for case in cases(groups, engines, sizes):
+        # a fresh process per case keeps peak RSS and caches per case
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            result = pool.submit(_measure, case, min_time).result()
+        result['id'] = case_id(case)
+        results.append(result)
+        if progress:
+            progress(result)
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'min_time': min_time,
+        },
+        'results': results,
+    }
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    return report
+
+def compare(baseline, current, threshold=REGRESSION_THRESHOLD):
+    """
+    Compare two reports (dicts or JSON file paths) case by case.
+    Returns the regressions, cases whose ns/block grew by more than threshold,
+    as dicts with id, baseline_ns, current_ns and change (fraction).
+    """
+    def load(report):
+        if isinstance(report, str):
+            with open(report, 'r', encoding='utf-8') as f:
+                report = json.load(f)
+        return {result['id']: result for result in report['results']}
+    baseline, current = load(baseline), load(current)
+    regressions = []
+    for result_id, result in current.items():
+        if result_id not in baseline:
+            continue
+        baseline_ns, current_ns = baseline[result_id]['ns_per_block'], result['ns_per_block']
+        change = current_ns / baseline_ns - 1
+        if change > threshold:
+            regressions.append({'id': result_id, 'baseline_ns': baseline_ns, 'current_ns': current_ns, 'change': change})
+    return regressions
+
+def _print_result(result):
+    print(f"{result['id']:<40} {result['ns_per_block']:>14,.0f} ns/block {result['mb_per_s']:>10.2f} MB/s "
+          f"{result['peak_rss_bytes'] / 2**20:>8.1f} MiB", flush=True)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mini-AES benchmark suite")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run", help="run the benchmarks")
+    run_parser.add_argument("-o", "--output", help="JSON report path")
+    run_parser.add_argument("--groups", nargs="*", default=GROUPS, choices=GROUPS)
+    run_parser.add_argument("--engines", nargs="*")
+    run_parser.add_argument("--sizes", nargs="*", type=int, help="input sizes in bytes")
+    run_parser.add_argument("--full", action="store_true", help="include the 100 MB inputs")
+    run_parser.add_argument("--min-time", type=float, default=MIN_TIME)
+    compare_parser = commands.add_parser("compare", help="flag regressions against a baseline report")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    args = parser.parse_args()
+
+    if args.command == "run":
+        sizes = args.sizes or (FULL_SIZES if args.full else SIZES)
+        run(args.groups, args.engines, sizes, args.min_time, args.output, _print_result)
+    else:
+        regressions = compare(args.baseline, args.current, args.threshold)
+        for regression in regressions:
+            print("REGRESSION {id}: {baseline_ns:,.0f} -> {current_ns:,.0f} ns/block ({change:+.0%})".format(**regression))
+        print(f"{len(regressions)} regression(s)")
+        raise SystemExit(1 if regressions else 0)
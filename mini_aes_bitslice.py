@@ -0,0 +1,185 @@
+import sys
+from array import array
+
+import mini_aes
+from mini_aes import NUM_ROUNDS, S_BOX, INV_S_BOX, MIX_COL_MATRIX, INV_MIX_COL_MATRIX, gf_multiply
+
+# Bitsliced engine: N blocks are transposed into 16 bit-planes, each held in one
+# Python int (plane j holds bit j of every packed block, bit i of the plane
+# belongs to block i). Every round step is then a handful of big-int operations
+# that process all N blocks at once, with no NumPy needed.
+
+# blocks per bitsliced pass
+BATCH_BLOCKS = 1 << 16
+
+# plane index of bit b (b = 0 is the least significant) of nibble k (N0..N3)
+def _plane(k, b):
+    return (3 - k) * 4 + b
+
+def _sbox_anf(sbox):
+    # Algebraic normal form of each output bit: the set of monomials (bit masks
+    # over the 4 input bits) whose AND terms XOR together to that output bit.
+    anf = []
+    for out_bit in range(4):
+        coeffs = [(sbox[x] >> out_bit) & 1 for x in range(16)]
+        for i in range(4):
+            for x in range(16):
+                if x & (1 << i):
+                    coeffs[x] ^= coeffs[x ^ (1 << i)]
+        anf.append([m for m in range(16) if coeffs[m]])
+    return anf
+
+S_BOX_ANF = _sbox_anf(S_BOX)
+INV_S_BOX_ANF = _sbox_anf(INV_S_BOX)
+
+def _mix_network(matrix):
+    # MixColumns is linear over GF(2): output plane = XOR of a fixed set of input
+    # planes. Returns, for every output plane, the input planes feeding it.
+    def bit_matrix(c):
+        return [[(gf_multiply(c, 1 << ib) >> ob) & 1 for ib in range(4)] for ob in range(4)]
+    network = [None] * 16
+    for top, bottom in ((0, 1), (2, 3)): # the two columns
+        for row, out_nibble in enumerate((top, bottom)):
+            m_top, m_bottom = bit_matrix(matrix[row][0]), bit_matrix(matrix[row][1])
+            for ob in range(4):
+                inputs = [_plane(top, ib) for ib in range(4) if m_top[ob][ib]]
+                inputs += [_plane(bottom, ib) for ib in range(4) if m_bottom[ob][ib]]
+                network[_plane(out_nibble, ob)] = inputs
+    return network
+
+MIX_NETWORK = _mix_network(MIX_COL_MATRIX)
+INV_MIX_NETWORK = _mix_network(INV_MIX_COL_MATRIX)
+
+# ShiftRows swaps N1 and N3
+SHIFT_ROWS_PERMUTATION = list(range(16))
+for _b in range(4):
+    SHIFT_ROWS_PERMUTATION[_plane(1, _b)] = _plane(3, _b)
+    SHIFT_ROWS_PERMUTATION[_plane(3, _b)] = _plane(1, _b)
+
+def sub_nibbles(planes, anf, ones):
+    out = [0] * 16
+    for k in range(4):
+        x = [planes[_plane(k, b)] for b in range(4)]
+        # AND of every subset of the 4 input bits, built from the smaller subsets
+        products = [ones] + [0] * 15
+        for m in range(1, 16):
+            low = m & -m
+            products[m] = products[m ^ low] & x[low.bit_length() - 1]
+        for b in range(4):
+            y = 0
+            for m in anf[b]:
+                y ^= products[m]
+            out[_plane(k, b)] = y
+    return out
+
+def shift_rows(planes):
+    return [planes[j] for j in SHIFT_ROWS_PERMUTATION]
+
+def mix_columns(planes, network):
+    out = []
+    for inputs in network:
+        y = 0
+        for j in inputs:
+            y ^= planes[j]
+        out.append(y)
+    return out
+
+def add_round_key(planes, round_key, ones):
+    return [p ^ ones if (round_key >> j) & 1 else p for j, p in enumerate(planes)]
+
+def encrypt_planes(planes, round_keys, ones):
+    planes = add_round_key(planes, round_keys[0], ones)
+    for r in range(1, NUM_ROUNDS):
+        planes = mix_columns(shift_rows(sub_nibbles(planes, S_BOX_ANF, ones)), MIX_NETWORK)
+        planes = add_round_key(planes, round_keys[r], ones)
+    planes = shift_rows(sub_nibbles(planes, S_BOX_ANF, ones))
+    return add_round_key(planes, round_keys[NUM_ROUNDS], ones)
+
+def decrypt_planes(planes, round_keys, ones):
+    planes = add_round_key(planes, round_keys[NUM_ROUNDS], ones)
+    planes = sub_nibbles(shift_rows(planes), INV_S_BOX_ANF, ones)
+    planes = add_round_key(planes, round_keys[NUM_ROUNDS-1], ones)
+    for r in range(NUM_ROUNDS-2, -1, -1):
+        planes = mix_columns(planes, INV_MIX_NETWORK)
+        planes = sub_nibbles(shift_rows(planes), INV_S_BOX_ANF, ones)
+        planes = add_round_key(planes, round_keys[r], ones)
+    return planes
+
+# byte -> b'0'/b'1' for one bit, and back
+_BIT_TO_ASCII = [bytes(0x31 if (v >> b) & 1 else 0x30 for v in range(256)) for b in range(8)]
+_ASCII_TO_BIT = bytes.maketrans(b"01", b"\x00\x01")
+
+def _big_endian_bytes(blocks):
+    data = array('H', blocks)
+    if sys.byteorder == "little":
+        data.byteswap()
+    return data.tobytes()
+
+def to_planes(blocks):
+    """Transpose a sequence of packed blocks into 16 bit-planes."""
+    data = _big_endian_bytes(blocks)
+    high, low = data[0::2], data[1::2]
+    planes = [int(low.translate(_BIT_TO_ASCII[b]), 2) for b in range(8)]
+    planes += [int(high.translate(_BIT_TO_ASCII[b]), 2) for b in range(8)]
+    return planes
+
+def from_planes(planes, count):
+    """Transpose 16 bit-planes back into an array('H') of count blocks."""
+    def column_bytes(byte_planes):
+        # each plane becomes count bytes of 0/1; shifting them into place and
+        # OR-ing never carries across bytes
+        value = 0
+        for b, plane in enumerate(byte_planes):
+            bits = format(plane, "0{}b".format(count)).encode("ascii").translate(_ASCII_TO_BIT)
+            value |= int.from_bytes(bits, "big") << b
+        return value.to_bytes(count, "big")
+    data = bytearray(2 * count)
+    data[0::2] = column_bytes(planes[8:])
+    data[1::2] = column_bytes(planes[:8])
+    out = array('H', data)
+    if sys.byteorder == "little":
+        out.byteswap()
+    return out
+
+def _run_batches(blocks, planes_fn, round_keys):
+    out = array('H')
+    for start in range(0, len(blocks), BATCH_BLOCKS):
+        batch = blocks[start:start + BATCH_BLOCKS]
+        count = len(batch)
+        ones = (1 << count) - 1
+        out.extend(from_planes(planes_fn(to_planes(batch), round_keys, ones), count))
+    return out
+
+def encrypt_blocks(blocks, round_keys):
+    return _run_batches(array('H', blocks), encrypt_planes, round_keys)
+
+def decrypt_blocks(blocks, round_keys):
+    return _run_batches(array('H', blocks), decrypt_planes, round_keys)
+
+class BitsliceEngine(mini_aes.TTableEngine):
+    """
+    Bitsliced engine for bulk ECB and CBC decryption without NumPy.
+    Single blocks and the sequential modes (CBC and CFB encryption) use the
+    T-table path of the default engine.
+    """
+    name = "bitslice"
+
+    def encrypt_blocks(self, blocks):
+        return encrypt_blocks(blocks, self.round_keys)
+
+    def decrypt_blocks(self, blocks):
+        return decrypt_blocks(blocks, self.round_keys)
+
+    def decrypt_cbc_blocks(self, blocks, iv):
+        blocks = array('H', blocks)
+        if not blocks:
+            return array('H')
+        out = decrypt_blocks(blocks, self.round_keys)
+        previous_blocks = array('H', [iv])
+        previous_blocks.extend(blocks[:-1])
+        # XOR the whole buffers as two big ints
+        size = 2 * len(out)
+        mixed = int.from_bytes(out.tobytes(), "big") ^ int.from_bytes(previous_blocks.tobytes(), "big")
+        return array('H', mixed.to_bytes(size, "big"))
+
+mini_aes.register_engine(BitsliceEngine.name, BitsliceEngine)
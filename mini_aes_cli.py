@@ -0,0 +1,194 @@
+import argparse
+import os
+import shlex
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import mini_aes
+
+# Command-line front end, installed as the mini-aes console script.
+# encrypt/decrypt stream stdin to stdout (or --input/--output files) through a
+# CipherContext, so memory stays bounded by --chunk-size whatever the input
+# size. --manifest instead processes a list of "SRC DST" file pairs on a
+# process pool. Statistics and errors go to stderr, never into the output.
+
+def _read_chunks(src, chunk_size):
+    while chunk := src.read(chunk_size):
+        yield chunk
+
+def _hex_chunks(src, chunk_size):
+    # hex text -> bytes; whitespace (line breaks) is ignored and an odd
+    # trailing digit is carried over to the next chunk
+    carry = ""
+    for chunk in _read_chunks(src, chunk_size):
+        text = carry + "".join(chunk.split())
+        whole = len(text) & ~1
+        carry = text[whole:]
+        yield mini_aes.hex_to_bytes(text[:whole])
+    if carry:
+        raise ValueError("Input must be a valid hexadecimal string")
+
+def _write(dst, output, hex_io):
+    dst.write(output.hex().upper() if hex_io else output)
+    return len(output)
+
+def crypt_stream(cipher, decrypt, src, dst, cipher_mode="ECB", iv=None, hex_io=False,
+                 chunk_size=mini_aes.STREAM_CHUNK_SIZE):
+    """
+    Encrypt or decrypt src into dst chunk by chunk. With hex_io both are text
+    streams of hex digits, otherwise binary streams. iv (a 16-bit int) is only
+    used when encrypting; modes with an IV write it first.
+    Returns (bytes_in, bytes_out), counted as binary data.
+    """
+    context = cipher.decryptor(cipher_mode) if decrypt else cipher.encryptor(cipher_mode, iv)
+    chunks = _hex_chunks(src, chunk_size) if hex_io else _read_chunks(src, chunk_size)
+    bytes_in = bytes_out = 0
+    for chunk in chunks:
+        bytes_in += len(chunk)
+        bytes_out += _write(dst, context.update(chunk), hex_io)
+    bytes_out += _write(dst, context.finalize(), hex_io)
+    if hex_io:
+        dst.write("\n")
+    dst.flush()
+    return bytes_in, bytes_out
+
+def read_manifest(path):
+    """
+    (src, dst) pairs from a manifest file: one "SRC DST" pair per line, quoted
+    like a shell command line when a path has spaces. Blank lines and lines
+    starting with # are skipped. Raises ValueError on a malformed line.
+    """
+    jobs = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip() or line.lstrip().startswith("#"):
+                continue
+            fields = shlex.split(line)
+            if len(fields) != 2:
+                raise ValueError(f"{path}:{number}: expected 'SRC DST', got {line.strip()!r}")
+            jobs.append((fields[0], fields[1]))
+    return jobs
+
+def _run_job(decrypt, src, dst, key_hex, cipher_mode, iv_hex, chunk_size, engine):
+    # (bytes_in, bytes_out, error) of one manifest entry
+    try:
+        if decrypt:
+            bytes_out = mini_aes.decrypt_file(src, dst, key_hex, cipher_mode, chunk_size, engine=engine)
+        else:
+            bytes_out = mini_aes.encrypt_file(src, dst, key_hex, cipher_mode, iv_hex, chunk_size, engine=engine)
+        return os.path.getsize(src), bytes_out, None
+    except (ValueError, OSError) as e:
+        return 0, 0, str(e)
+
+def run_manifest(jobs, decrypt, key_hex, cipher_mode="ECB", iv_hex=None, workers=None,
+                 chunk_size=mini_aes.STREAM_CHUNK_SIZE, engine=mini_aes.DEFAULT_ENGINE):
+    """
+    Encrypt or decrypt every (src, dst) pair of jobs with encrypt_file()/decrypt_file(),
+    on workers processes (None means os.cpu_count(), 1 runs here). A failing file
+    does not stop the others. Returns one (src, dst, bytes_in, bytes_out, error)
+    tuple per job, in job order; error is None on success.
+    """
+    workers = workers or os.cpu_count() or 1
+    args = (key_hex, cipher_mode, iv_hex, chunk_size, engine)
+    if workers == 1 or len(jobs) <= 1:
+        results = [_run_job(decrypt, src, dst, *args) for src, dst in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+            futures = [pool.submit(_run_job, decrypt, src, dst, *args) for src, dst in jobs]
+            results = [future.result() for future in futures]
+    return [(src, dst, *result) for (src, dst), result in zip(jobs, results)]
+
+def _print_stats(bytes_in, bytes_out, seconds, files=None):
+    rate = bytes_in / seconds / 1e6 if seconds else float('inf')
+    files = f"{files} files, " if files is not None else ""
+    print(f"{files}{bytes_in:,} bytes in, {bytes_out:,} bytes out, {seconds:.3f} s, {rate:.2f} MB/s",
+          file=sys.stderr)
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="mini-aes", description="Mini-AES encryption and decryption")
+    parser.add_argument("operation", choices=("encrypt", "decrypt"))
+    parser.add_argument("-k", "--key", required=True, help="16-bit key (4 hex characters)")
+    parser.add_argument("-m", "--mode", type=str.upper, default="ECB", choices=mini_aes.CIPHER_MODES,
+                        help="cipher mode (default: ECB)")
+    parser.add_argument("--iv", help="IV for encryption (4 hex characters, random when omitted; "
+                                     "not allowed with --manifest)")
+    parser.add_argument("-i", "--input", default="-", help="input file (default: stdin)")
+    parser.add_argument("-o", "--output", default="-", help="output file (default: stdout)")
+    parser.add_argument("--hex", action="store_true", help="read and write hex text instead of binary data")
+    parser.add_argument("--manifest", help="file of 'SRC DST' lines to process instead of --input/--output")
+    parser.add_argument("--workers", type=int, default=None, help="processes for --manifest (default: CPU count)")
+    parser.add_argument("--engine", default=mini_aes.DEFAULT_ENGINE,
+                        choices=mini_aes.engine_names())
+    parser.add_argument("--chunk-size", type=int, default=mini_aes.STREAM_CHUNK_SIZE, help="bytes per read")
+    parser.add_argument("--stats", action="store_true", help="print throughput to stderr when done")
+    return parser
+
+def _open(path, mode, hex_io, std):
+    if path == "-":
+        return std if hex_io else std.buffer
+    return open(path, mode if hex_io else mode + "b")
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    decrypt = args.operation == "decrypt"
+    if args.chunk_size < 1:
+        parser.error("--chunk-size must be a positive number of bytes")
+    if args.manifest and (args.hex or args.input != "-" or args.output != "-"):
+        parser.error("--manifest cannot be combined with --hex, --input or --output")
+    if decrypt and args.iv:
+        parser.error("--iv is only used when encrypting; a decryptor reads the IV from the input")
+    if args.manifest and args.iv:
+        # one IV for many files would repeat the CTR/OFB keystream across them
+        parser.error("--iv cannot be combined with --manifest; each file gets its own random IV")
+
+    started = time.perf_counter()
+    try:
+        cipher = mini_aes.MiniAES(args.key, args.engine)
+        iv = mini_aes.hex_to_int(args.iv) if args.iv else None
+        if args.manifest:
+            results = run_manifest(read_manifest(args.manifest), decrypt, args.key, args.mode, None,
+                                   args.workers, args.chunk_size, args.engine)
+            failed = 0
+            for src, dst, _, _, error in results:
+                if error:
+                    failed += 1
+                    print(f"mini-aes: {src}: {error}", file=sys.stderr)
+            if args.stats:
+                _print_stats(sum(r[2] for r in results), sum(r[3] for r in results),
+                             time.perf_counter() - started, len(results))
+            return 1 if failed else 0
+        src = _open(args.input, "r", args.hex, sys.stdin)
+        # an output file is written under a temporary name and only replaces
+        # args.output once the whole input went through, so bad input leaves no partial file
+        temp_path = args.output + ".tmp" if args.output != "-" else "-"
+        completed = False
+        try:
+            dst = _open(temp_path, "w", args.hex, sys.stdout)
+            try:
+                bytes_in, bytes_out = crypt_stream(cipher, decrypt, src, dst, args.mode, iv, args.hex, args.chunk_size)
+                completed = True
+            finally:
+                if temp_path != "-":
+                    dst.close()
+                    if completed:
+                        os.replace(temp_path, args.output)
+                    else:
+                        os.remove(temp_path)
+        finally:
+            if args.input != "-":
+                src.close()
+    except (ValueError, OSError) as e:
+        if isinstance(e, BrokenPipeError):
+            # the reader of stdout went away (e.g. "| head"); exit quietly
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+            return 1
+        print(f"mini-aes: error: {e}", file=sys.stderr)
+        return 1
+    if args.stats:
+        _print_stats(bytes_in, bytes_out, time.perf_counter() - started)
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
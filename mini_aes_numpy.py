@@ -0,0 +1,111 @@
+import numpy as np
+from array import array
+
+import mini_aes
+from mini_aes import NUM_ROUNDS, S_BOX, INV_S_BOX, MIX_COL_MATRIX, INV_MIX_COL_MATRIX, gf_multiply
+
+# NumPy engine: every round step is applied to a whole uint16 array of packed
+# blocks at once (column 0 in the high byte, column 1 in the low byte, same as
+# the packed fast path in mini_aes).
+
+def column_sub_table(sbox):
+    """SubNibbles on one column byte as a 256-entry uint16 table, for any S-box."""
+    return np.array([(sbox[col >> 4] << 4) | sbox[col & 0xF] for col in range(256)], dtype=np.uint16)
+
+def _column_mix_table(matrix):
+    # MixColumns on one column byte, from the GF(2^4) products of gf_multiply
+    table = []
+    for col in range(256):
+        s0, s1 = col >> 4, col & 0xF
+        c0 = gf_multiply(matrix[0][0], s0) ^ gf_multiply(matrix[0][1], s1)
+        c1 = gf_multiply(matrix[1][0], s0) ^ gf_multiply(matrix[1][1], s1)
+        table.append((c0 << 4) | c1)
+    return np.array(table, dtype=np.uint16)
+
+SUB_TABLE = column_sub_table(S_BOX)
+INV_SUB_TABLE = column_sub_table(INV_S_BOX)
+MIX_TABLE = _column_mix_table(MIX_COL_MATRIX)
+INV_MIX_TABLE = _column_mix_table(INV_MIX_COL_MATRIX)
+
+def _per_column(state, table):
+    return (table[state >> 8] << 8) | table[state & 0xFF]
+
+def sub_nibbles(state, table=SUB_TABLE):
+    return _per_column(state, table)
+
+def shift_rows(state):
+    # swaps N1 and N3 in every block
+    return (state & 0xF0F0) | ((state >> 8) & 0x000F) | ((state & 0x000F) << 8)
+
+def mix_columns(state, table=MIX_TABLE):
+    return _per_column(state, table)
+
+def add_round_key(state, round_key):
+    # round_key may be a scalar or an array with one round key per block
+    return state ^ round_key
+
+# The key-independent part of each round fused into one 65536-entry table, so a
+# round is a single gather followed by AddRoundKey.
+_ALL_BLOCKS = np.arange(0x10000, dtype=np.uint16)
+ROUND_TABLE = mix_columns(shift_rows(sub_nibbles(_ALL_BLOCKS)))
+FINAL_ROUND_TABLE = shift_rows(sub_nibbles(_ALL_BLOCKS))
+INV_ROUND_TABLE = sub_nibbles(shift_rows(mix_columns(_ALL_BLOCKS, INV_MIX_TABLE)), INV_SUB_TABLE)
+INV_FINAL_ROUND_TABLE = sub_nibbles(shift_rows(_ALL_BLOCKS), INV_SUB_TABLE)
+
+def _as_round_keys(round_keys):
+    return [rk if isinstance(rk, np.ndarray) else np.uint16(rk) for rk in round_keys]
+
+def encrypt_array(blocks, round_keys):
+    """
+    Encrypt a uint16 array of blocks.
+    round_keys are RK0..RK3 packed as ints (or uint16 arrays broadcastable to blocks).
+    """
+    round_keys = _as_round_keys(round_keys)
+    state = add_round_key(np.asarray(blocks, dtype=np.uint16), round_keys[0])
+    for r in range(1, NUM_ROUNDS):
+        state = add_round_key(ROUND_TABLE[state], round_keys[r])
+    return add_round_key(FINAL_ROUND_TABLE[state], round_keys[NUM_ROUNDS])
+
+def decrypt_array(blocks, round_keys):
+    """Decrypt a uint16 array of blocks; see encrypt_array()."""
+    round_keys = _as_round_keys(round_keys)
+    state = add_round_key(np.asarray(blocks, dtype=np.uint16), round_keys[NUM_ROUNDS])
+    state = add_round_key(INV_FINAL_ROUND_TABLE[state], round_keys[NUM_ROUNDS-1])
+    for r in range(NUM_ROUNDS-2, -1, -1):
+        state = add_round_key(INV_ROUND_TABLE[state], round_keys[r])
+    return state
+
+def decrypt_cbc_array(blocks, iv, round_keys):
+    """CBC decryption of a uint16 array of ciphertext blocks (IV not included)."""
+    blocks = np.asarray(blocks, dtype=np.uint16)
+    previous_blocks = np.empty_like(blocks)
+    previous_blocks[:1] = iv
+    previous_blocks[1:] = blocks[:-1]
+    return decrypt_array(blocks, round_keys) ^ previous_blocks
+
+def _to_numpy(blocks):
+    if isinstance(blocks, array) and blocks.typecode == 'H':
+        return np.frombuffer(blocks, dtype=np.uint16)
+    return np.asarray(blocks, dtype=np.uint16)
+
+def _to_block_array(state):
+    return array('H', state.astype(np.uint16, copy=False).tobytes())
+
+class NumpyEngine(mini_aes.TTableEngine):
+    """
+    Vectorized engine for bulk ECB and CBC decryption.
+    Single blocks and the sequential modes (CBC and CFB encryption) use the
+    T-table path of the default engine.
+    """
+    name = "numpy"
+
+    def encrypt_blocks(self, blocks):
+        return _to_block_array(encrypt_array(_to_numpy(blocks), self.round_keys))
+
+    def decrypt_blocks(self, blocks):
+        return _to_block_array(decrypt_array(_to_numpy(blocks), self.round_keys))
+
+    def decrypt_cbc_blocks(self, blocks, iv):
+        return _to_block_array(decrypt_cbc_array(_to_numpy(blocks), iv, self.round_keys))
+
+mini_aes.register_engine(NumpyEngine.name, NumpyEngine)
@@ -0,0 +1,123 @@
+import functools
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import mini_aes
+from mini_aes import DEFAULT_ENGINE, MiniAES
+
+# Multi-core ECB and CBC decryption. Both only need the ciphertext (CBC decryption
+# of a block needs the previous ciphertext block, never the previous plaintext),
+# so the input is split into shards that run on a process pool. Input and output
+# live in shared memory; only the segment names and shard bounds are pickled.
+
+# blocks per shard (1 MiB of data)
+SHARD_BLOCKS = 1 << 19
+
+@functools.lru_cache(maxsize=64)
+def _worker_cipher(key, engine):
+    return MiniAES(key, engine)
+
+def _process_shard(operation, key, engine, in_name, out_name, start, stop):
+    # start/stop are block indices into the input segment; the output block of
+    # input block i is i for ECB and i - 1 for CBC (the IV is input block 0)
+    cipher = _worker_cipher(key, engine)
+    in_shm = shared_memory.SharedMemory(name=in_name)
+    out_shm = shared_memory.SharedMemory(name=out_name)
+    try:
+        _process_range(cipher, operation, in_shm.buf, out_shm.buf, start, stop)
+    finally:
+        in_shm.close()
+        out_shm.close()
+    return stop - start
+
+def _process_range(cipher, operation, in_buf, out_buf, start, stop):
+    if operation == "decrypt_cbc":
+        with in_buf[2 * (start - 1):2 * stop] as src, out_buf[2 * (start - 1):2 * (stop - 1)] as dst:
+            cipher.decrypt_cbc_bytes(src, out=dst)
+    else:
+        method = cipher.encrypt_ecb_bytes if operation == "encrypt_ecb" else cipher.decrypt_ecb_bytes
+        with in_buf[2 * start:2 * stop] as src, out_buf[2 * start:2 * stop] as dst:
+            method(src, out=dst)
+
+class ParallelExecutor:
+    """
+    Runs ECB encryption/decryption and CBC decryption on a process pool.
+    workers defaults to os.cpu_count(); shard_blocks is the number of blocks per
+    task. Inputs smaller than one shard (or workers=1) run in this process. The
+    output is identical to the serial MiniAES methods.
+    Use as a context manager, or call close(), to shut the pool down.
+    """
+    def __init__(self, workers=None, shard_blocks=SHARD_BLOCKS, engine=DEFAULT_ENGINE):
+        if shard_blocks < 1:
+            raise ValueError("shard_blocks must be at least 1")
+        self.workers = workers or os.cpu_count() or 1
+        self.shard_blocks = shard_blocks
+        self.engine = engine
+        self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def _get_pool(self):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self._pool
+
+    def encrypt_ecb(self, data, key, out=None):
+        """ECB over a bytes-like object; writes into out or returns a new bytearray."""
+        return self._run("encrypt_ecb", data, key, out)
+
+    def decrypt_ecb(self, data, key, out=None):
+        return self._run("decrypt_ecb", data, key, out)
+
+    def decrypt_cbc(self, data, key, out=None):
+        """CBC decryption; the first 2 bytes of data are the IV, like MiniAES.decrypt_cbc_bytes()."""
+        return self._run("decrypt_cbc", data, key, out)
+
+    def _run(self, operation, data, key, out):
+        cipher = MiniAES(key, self.engine)
+        src = memoryview(data).cast('B')
+        if len(src) % 2 != 0:
+            raise ValueError("Data length must be a multiple of 2 bytes (16-bit blocks)")
+        total = len(src) // 2
+        first = 0
+        out_size = len(src)
+        if operation == "decrypt_cbc":
+            if total < 2:
+                raise ValueError("Ciphertext too short. Need at least IV (2 bytes) + one block (2 bytes)")
+            first = 1
+            out_size -= 2
+        out, dst = mini_aes.output_buffer(out, out_size)
+
+        if self.workers == 1 or total - first <= self.shard_blocks:
+            _process_range(cipher, operation, src, dst, first, total)
+            return out
+
+        in_shm = shared_memory.SharedMemory(create=True, size=len(src))
+        out_shm = shared_memory.SharedMemory(create=True, size=out_size)
+        try:
+            in_shm.buf[:len(src)] = src
+            pool = self._get_pool()
+            futures = [
+                pool.submit(_process_shard, operation, cipher.key, self.engine, in_shm.name, out_shm.name,
+                            start, min(start + self.shard_blocks, total))
+                for start in range(first, total, self.shard_blocks)
+            ]
+            for future in futures:
+                future.result()
+            dst[:out_size] = out_shm.buf[:out_size]
+        finally:
+            in_shm.close()
+            in_shm.unlink()
+            out_shm.close()
+            out_shm.unlink()
+        return out
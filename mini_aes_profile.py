@@ -0,0 +1,222 @@
+import functools
+import json
+import os
+import threading
+from time import perf_counter_ns
+
+import mini_aes
+
+# Opt-in instrumentation. enable_profiling() rebinds the round functions, the
+# engines' block methods and the mode drivers of mini_aes (module functions and
+# MiniAES/CipherContext methods) to wrappers that count calls, blocks and time;
+# disable_profiling() puts the originals back, so a disabled profiler costs
+# nothing at all. Callers must look the functions up through the module
+# (mini_aes.encrypt, not a name imported before enabling) to be profiled.
+# Round steps run while a lookup table is built are not counted, so the counters
+# reflect the work done on data, not one-off precomputation.
+# Counters are updated without a lock, so under threads they are approximate.
+
+# traced round steps and the packed fast path (1 block per call)
+ROUND_FUNCTIONS = (
+    "sub_nibbles", "shift_rows", "mix_columns", "add_round_key", "key_expansion",
+    "_sub_nibbles_packed", "_shift_rows_packed", "_mix_columns_packed",
+    "encrypt_block_packed", "decrypt_block_packed", "get_key_schedule",
+)
+
+# block methods of the engines registered when profiling starts, counted under
+# the class that defines them (a sequence of blocks after self)
+ENGINE_METHODS = ("encrypt_blocks", "decrypt_blocks", "encrypt_cbc_blocks", "decrypt_cbc_blocks")
+
+# cached table builders; nothing is counted while they run
+TABLE_BUILDERS = ("_codebook_column_tables", "get_codebooks", "get_t_tables", "get_ofb_cycle")
+
+# module-level drivers taking hex text first
+HEX_DRIVERS = (
+    "encrypt", "decrypt", "encrypt_cbc", "decrypt_cbc", "encrypt_ctr", "decrypt_ctr",
+    "encrypt_ofb", "decrypt_ofb", "encrypt_cfb", "decrypt_cfb", "encrypt_double", "decrypt_double",
+    "cbc_mac",
+)
+
+# module-level drivers taking a source file path first
+FILE_DRIVERS = ("encrypt_file", "decrypt_file")
+
+# methods taking a bytes-like object after self
+BUFFER_METHODS = {
+    mini_aes.MiniAES: (
+        "encrypt_ecb_bytes", "decrypt_ecb_bytes", "encrypt_cbc_bytes", "decrypt_cbc_bytes",
+        "crypt_ctr_range", "crypt_ofb", "encrypt_cfb_bytes", "decrypt_cfb_bytes", "mac_bytes",
+    ),
+    mini_aes.CipherContext: ("update",),
+    mini_aes.CBCMAC: ("update",),
+}
+
+# latency histogram buckets: bucket b counts calls with 2^(b-1) <= ns per block < 2^b
+HISTOGRAM_BUCKETS = 48
+
+class _Counter:
+    __slots__ = ("calls", "blocks", "total_ns", "histogram")
+
+    def __init__(self):
+        self.calls = 0
+        self.blocks = 0
+        self.total_ns = 0
+        self.histogram = [0] * HISTOGRAM_BUCKETS
+
+    def record(self, elapsed_ns, blocks):
+        self.calls += 1
+        self.blocks += blocks
+        self.total_ns += elapsed_ns
+        self.histogram[min((elapsed_ns // (blocks or 1)).bit_length(), HISTOGRAM_BUCKETS - 1)] += 1
+
+_counters = {}
+_originals = {} # (owner, name) -> (original attribute, wrapper)
+_building = threading.local() # depth of table builders running on this thread
+_dump_stop = None
+
+# cache attributes kept on the wrappers, so cache_info()/cache_clear() (and
+# get_ofb_cycle.lookup()) still work
+_CACHE_ATTRIBUTES = ("cache_info", "cache_clear", "cache_parameters", "lookup")
+
+def _one_block(args):
+    return 1
+
+def _hex_blocks(args):
+    return len(args[0]) // 4 if args and isinstance(args[0], str) else 0
+
+def _file_blocks(args):
+    try:
+        return os.path.getsize(args[0]) // 2
+    except (OSError, TypeError, IndexError):
+        return 0
+
+def _buffer_blocks(args):
+    try:
+        return memoryview(args[1]).nbytes // 2
+    except (TypeError, IndexError):
+        return 0
+
+def _sequence_blocks(args):
+    try:
+        return len(args[1])
+    except (TypeError, IndexError):
+        return 0
+
+def _keep_cache_attributes(wrapper, function):
+    for attribute in _CACHE_ATTRIBUTES:
+        if hasattr(function, attribute):
+            setattr(wrapper, attribute, getattr(function, attribute))
+    return wrapper
+
+def _instrument(name, function, count_blocks):
+    counter = _counters.setdefault(name, _Counter())
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if getattr(_building, 'depth', 0):
+            return function(*args, **kwargs)
+        started = perf_counter_ns()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            counter.record(perf_counter_ns() - started, count_blocks(args))
+    return _keep_cache_attributes(wrapper, function)
+
+def _uncounted(function):
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        _building.depth = getattr(_building, 'depth', 0) + 1
+        try:
+            return function(*args, **kwargs)
+        finally:
+            _building.depth -= 1
+    return _keep_cache_attributes(wrapper, function)
+
+def _rebind(owner, name, wrap):
+    original = getattr(owner, name)
+    wrapper = wrap(original)
+    _originals[(owner, name)] = (original, wrapper)
+    setattr(owner, name, wrapper)
+
+def enable_profiling(round_functions=True, drivers=True):
+    """Start counting. round_functions and drivers select which groups are wrapped."""
+    if _originals:
+        return
+    if round_functions:
+        for name in ROUND_FUNCTIONS:
+            _rebind(mini_aes, name, lambda f, name=name: _instrument(name, f, _one_block))
+        for name in TABLE_BUILDERS:
+            _rebind(mini_aes, name, _uncounted)
+        for engine_class in set(mini_aes.ENGINES.values()):
+            for name in ENGINE_METHODS:
+                if name in vars(engine_class):
+                    qualified_name = f"{engine_class.__name__}.{name}"
+                    _rebind(engine_class, name, lambda f, q=qualified_name: _instrument(q, f, _sequence_blocks))
+    if drivers:
+        for name in HEX_DRIVERS:
+            _rebind(mini_aes, name, lambda f, name=name: _instrument(name, f, _hex_blocks))
+        for name in FILE_DRIVERS:
+            _rebind(mini_aes, name, lambda f, name=name: _instrument(name, f, _file_blocks))
+        for owner, names in BUFFER_METHODS.items():
+            for name in names:
+                qualified_name = f"{owner.__name__}.{name}"
+                _rebind(owner, name, lambda f, q=qualified_name: _instrument(q, f, _buffer_blocks))
+
+def disable_profiling():
+    """
+    Restore the original functions; the counters are kept until reset().
+    A function rebound while profiling (e.g. by mini_aes.set_key_schedule_cache_size())
+    keeps its new binding.
+    """
+    for (owner, name), (original, wrapper) in _originals.items():
+        if getattr(owner, name) is wrapper:
+            setattr(owner, name, original)
+    _originals.clear()
+
+def is_profiling():
+    return bool(_originals)
+
+def reset():
+    """Zero all counters."""
+    for counter in _counters.values():
+        counter.__init__()
+
+def snapshot():
+    """
+    The counters as a dict: name -> calls, blocks, total_seconds, ns_per_block and
+    histogram (upper bound in ns per block -> calls, empty buckets left out).
+    Functions that were never called are left out.
+    """
+    report = {}
+    for name, counter in _counters.items():
+        if not counter.calls:
+            continue
+        report[name] = {
+            'calls': counter.calls,
+            'blocks': counter.blocks,
+            'total_seconds': counter.total_ns / 1e9,
+            'ns_per_block': counter.total_ns / counter.blocks if counter.blocks else None,
+            'histogram': {1 << b: count for b, count in enumerate(counter.histogram) if count},
+        }
+    return report
+
+def dump(path):
+    """Write snapshot() to path as JSON (replacing the file atomically)."""
+    temp_path = path + ".tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(snapshot(), f, indent=2)
+    os.replace(temp_path, path)
+
+def start_periodic_dump(path, interval=60.0):
+    """Dump the counters to path every interval seconds from a daemon thread."""
+    global _dump_stop
+    stop_periodic_dump()
+    stop = _dump_stop = threading.Event()
+    def loop():
+        while not stop.wait(interval):
+            dump(path)
+    threading.Thread(target=loop, name="mini-aes-profile-dump", daemon=True).start()
+
+def stop_periodic_dump():
+    global _dump_stop
+    if _dump_stop is not None:
+        _dump_stop.set()
+        _dump_stop = None
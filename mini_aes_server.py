@@ -0,0 +1,386 @@
+import argparse
+import asyncio
+import collections
+import functools
+import json
+import os
+import struct
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import mini_aes
+from mini_aes import CIPHER_MODES, DEFAULT_ENGINE, MiniAES
+
+# Shared encryption daemon. Clients send framed requests over TCP or a Unix
+# socket; requests for the same key that arrive within BATCH_WINDOW seconds are
+# grouped and run as one call on a worker process, so the key schedule and
+# engine tables are built once per worker and ECB requests share a single
+# engine call. Requests on a connection are pipelined: responses carry the
+# request id and may come back in any order.
+#
+# Frames are a 4-byte big-endian length followed by the body.
+# Request body:  REQUEST_HEADER (request id, operation, cipher mode index,
+#                flags, key, IV) + payload
+# Response body: RESPONSE_HEADER (request id, status) + output bytes, or a
+#                UTF-8 error message when status is STATUS_ERROR
+# OP_STATS returns stats() as JSON.
+
+REQUEST_HEADER = struct.Struct(">IBBBHH")
+RESPONSE_HEADER = struct.Struct(">IB")
+_LENGTH = struct.Struct(">I")
+
+OP_ENCRYPT = 0
+OP_DECRYPT = 1
+OP_STATS = 2
+
+FLAG_IV = 0x01 # the IV field is set (encryption; otherwise the IV is random)
+
+STATUS_OK = 0
+STATUS_ERROR = 1
+
+# largest accepted frame; a longer one closes the connection
+MAX_FRAME_BYTES = 16 << 20
+
+# seconds a key group waits for more requests before it is dispatched
+BATCH_WINDOW = 0.002
+
+# a group is dispatched early once it holds this much payload or this many requests
+MAX_BATCH_BYTES = 1 << 20
+MAX_BATCH_REQUESTS = 1024
+
+# latencies kept for the percentiles in stats()
+LATENCY_SAMPLES = 10000
+
+@functools.lru_cache(maxsize=256)
+def _worker_cipher(key, engine):
+    return MiniAES(key, engine)
+
+def process_batch(key, engine, requests):
+    """
+    Run a group of requests for one key. requests are (decrypt, cipher_mode,
+    iv, payload) tuples; the result is one (ok, output or error message) pair
+    per request. ECB requests of each direction go through one engine call,
+    the other modes through a CipherContext each (output as the *_bytes methods).
+    """
+    cipher = _worker_cipher(key, engine)
+    results = [None] * len(requests)
+    ecb = ([], []) # indices of whole-block ECB requests, by direction
+    for i, (decrypt, cipher_mode, iv, payload) in enumerate(requests):
+        if cipher_mode == "ECB" and len(payload) % 2 == 0:
+            ecb[decrypt].append(i)
+            continue
+        try:
+            context = cipher.decryptor(cipher_mode) if decrypt else cipher.encryptor(cipher_mode, iv)
+            results[i] = (True, context.update(payload) + context.finalize())
+        except ValueError as e:
+            results[i] = (False, str(e))
+    for decrypt, indices in enumerate(ecb):
+        if not indices:
+            continue
+        blocks = mini_aes.blocks_from_buffer(b"".join(requests[i][3] for i in indices))
+        blocks = cipher.engine.decrypt_blocks(blocks) if decrypt else cipher.engine.encrypt_blocks(blocks)
+        output = memoryview(mini_aes.blocks_to_buffer(blocks))
+        offset = 0
+        for i in indices:
+            size = len(requests[i][3])
+            results[i] = (True, bytes(output[offset:offset + size]))
+            offset += size
+    return results
+
+def encode_request(request_id, operation, cipher_mode="ECB", key=0, iv=None, payload=b""):
+    """A request frame; key and iv are 16-bit ints (iv None for a random IV)."""
+    body = REQUEST_HEADER.pack(request_id, operation, CIPHER_MODES.index(cipher_mode),
+                               FLAG_IV if iv is not None else 0, key, iv or 0)
+    return _LENGTH.pack(len(body) + len(payload)) + body + bytes(payload)
+
+def encode_response(request_id, ok, payload):
+    body = RESPONSE_HEADER.pack(request_id, STATUS_OK if ok else STATUS_ERROR)
+    if not ok:
+        payload = payload.encode('utf-8')
+    return _LENGTH.pack(len(body) + len(payload)) + body + payload
+
+async def read_frame(reader):
+    """The body of the next frame, or None at end of stream. Raises ValueError on an oversized frame."""
+    try:
+        length, = _LENGTH.unpack(await reader.readexactly(_LENGTH.size))
+        if length > MAX_FRAME_BYTES:
+            raise ValueError(f"Frame of {length} bytes exceeds the {MAX_FRAME_BYTES} byte limit")
+        return await reader.readexactly(length)
+    except asyncio.IncompleteReadError:
+        return None
+
+class _Group:
+    __slots__ = ("requests", "futures", "bytes", "timer")
+
+    def __init__(self):
+        self.requests = []
+        self.futures = []
+        self.bytes = 0
+        self.timer = None
+
+class BatchingServer:
+    """
+    The batching service. workers processes run the batches (None means
+    os.cpu_count()); window is the batching delay in seconds. Start listening
+    with start() (TCP host/port or a Unix socket path), stop with close().
+    stats() reports request and batch counts, queue depth and latency percentiles.
+    """
+    def __init__(self, workers=None, window=BATCH_WINDOW, max_batch_bytes=MAX_BATCH_BYTES,
+                 engine=DEFAULT_ENGINE):
+        mini_aes.get_engine(engine) # unknown names fail before the pool starts
+        self.workers = workers or os.cpu_count() or 1
+        self.window = window
+        self.max_batch_bytes = max_batch_bytes
+        self.engine = engine
+        self._pool = None
+        self._servers = []
+        self._connections = {} # handler task -> its StreamReader
+        self._groups = {} # key -> _Group collecting requests
+        self._queued = 0 # requests waiting in a group
+        self._in_flight = 0 # requests dispatched to the pool
+        self._requests = 0
+        self._batches = 0
+        self._errors = 0
+        self._latencies = collections.deque(maxlen=LATENCY_SAMPLES)
+        self._started = time.monotonic()
+
+    async def start(self, host=None, port=None, path=None):
+        """Listen on a Unix socket at path, or on TCP host:port. May be called more than once."""
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        if path:
+            server = await asyncio.start_unix_server(self._handle_connection, path=path)
+        else:
+            server = await asyncio.start_server(self._handle_connection, host, port)
+        self._servers.append(server)
+        return server
+
+    async def close(self):
+        for server in self._servers:
+            server.close()
+            await server.wait_closed()
+        self._servers.clear()
+        for key in list(self._groups):
+            self._dispatch(key)
+        # end every connection as if the client had hung up: the handlers answer
+        # what is still in flight, then close
+        for reader in self._connections.values():
+            reader.feed_eof()
+        await asyncio.gather(*self._connections, return_exceptions=True)
+        if self._pool is not None:
+            await asyncio.get_running_loop().run_in_executor(None, self._pool.shutdown)
+            self._pool = None
+
+    def stats(self):
+        latencies = sorted(self._latencies)
+        def percentile(p):
+            return latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))] * 1e3 if latencies else None
+        return {
+            'requests': self._requests,
+            'batches': self._batches,
+            'errors': self._errors,
+            'mean_batch_size': self._requests_batched() / self._batches if self._batches else None,
+            'queue_depth': self._queued + self._in_flight,
+            'queued': self._queued,
+            'in_flight': self._in_flight,
+            'latency_ms': {'p50': percentile(50), 'p90': percentile(90), 'p99': percentile(99),
+                           'max': latencies[-1] * 1e3 if latencies else None},
+            'uptime_seconds': time.monotonic() - self._started,
+        }
+
+    def _requests_batched(self):
+        return self._requests - self._queued - self._in_flight
+
+    def _submit(self, key, request):
+        future = asyncio.get_running_loop().create_future()
+        group = self._groups.get(key)
+        if group is None:
+            group = self._groups[key] = _Group()
+            group.timer = asyncio.get_running_loop().call_later(self.window, self._dispatch, key)
+        group.requests.append(request)
+        group.futures.append(future)
+        group.bytes += len(request[3])
+        self._queued += 1
+        self._requests += 1
+        if group.bytes >= self.max_batch_bytes or len(group.requests) >= MAX_BATCH_REQUESTS:
+            self._dispatch(key)
+        return future
+
+    def _dispatch(self, key):
+        group = self._groups.pop(key, None)
+        if group is None:
+            return
+        group.timer.cancel()
+        count = len(group.requests)
+        self._queued -= count
+        self._in_flight += count
+        batch = asyncio.get_running_loop().run_in_executor(self._pool, process_batch, key, self.engine, group.requests)
+        batch.add_done_callback(functools.partial(self._complete, group))
+
+    def _complete(self, group, batch):
+        self._in_flight -= len(group.requests)
+        self._batches += 1
+        if batch.exception() is not None:
+            results = [(False, f"Batch failed: {batch.exception()}")] * len(group.requests)
+        else:
+            results = batch.result()
+        for future, result in zip(group.futures, results):
+            if not future.done():
+                future.set_result(result)
+
+    async def _respond(self, writer, drain_lock, request_id, future, received):
+        ok, payload = await future
+        if not ok:
+            self._errors += 1
+        writer.write(encode_response(request_id, ok, payload))
+        self._latencies.append(time.perf_counter() - received)
+        async with drain_lock:
+            await writer.drain()
+
+    def _parse_request(self, body):
+        request_id, operation, mode_index, flags, key, iv = REQUEST_HEADER.unpack_from(body)
+        if operation not in (OP_ENCRYPT, OP_DECRYPT):
+            raise ValueError(f"Unknown operation {operation}")
+        if mode_index >= len(CIPHER_MODES):
+            raise ValueError(f"Unknown cipher mode {mode_index}")
+        request = (operation == OP_DECRYPT, CIPHER_MODES[mode_index], iv if flags & FLAG_IV else None,
+                   body[REQUEST_HEADER.size:])
+        return key, request
+
+    async def _handle_connection(self, reader, writer):
+        drain_lock = asyncio.Lock()
+        pending = set()
+        self._connections[asyncio.current_task()] = reader
+        try:
+            while True:
+                body = await read_frame(reader)
+                if body is None or len(body) < REQUEST_HEADER.size:
+                    break
+                received = time.perf_counter()
+                request_id, operation = REQUEST_HEADER.unpack_from(body)[:2]
+                if operation == OP_STATS:
+                    writer.write(encode_response(request_id, True, json.dumps(self.stats()).encode('utf-8')))
+                    continue
+                try:
+                    key, request = self._parse_request(body)
+                except ValueError as e:
+                    self._errors += 1
+                    writer.write(encode_response(request_id, False, str(e)))
+                    continue
+                task = asyncio.create_task(self._respond(writer, drain_lock, request_id,
+                                                         self._submit(key, request), received))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+        except (ValueError, ConnectionError):
+            pass
+        finally:
+            del self._connections[asyncio.current_task()]
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+class Client:
+    """
+    Asyncio client for BatchingServer. Requests on one connection are pipelined,
+    so many coroutines can share a client. Errors reported by the server raise
+    ValueError. Create with Client.connect(), release with close().
+    """
+    def __init__(self, reader, writer):
+        self._reader = reader
+        self._writer = writer
+        self._next_id = 0
+        self._waiting = {} # request id -> future
+        self._receiver = asyncio.create_task(self._receive())
+
+    @classmethod
+    async def connect(cls, host=None, port=None, path=None):
+        if path:
+            reader, writer = await asyncio.open_unix_connection(path)
+        else:
+            reader, writer = await asyncio.open_connection(host, port)
+        return cls(reader, writer)
+
+    async def _receive(self):
+        error = ConnectionError("Connection closed by the server")
+        try:
+            while (body := await read_frame(self._reader)) is not None:
+                request_id, status = RESPONSE_HEADER.unpack_from(body)
+                future = self._waiting.pop(request_id, None)
+                if future is None or future.done():
+                    continue
+                payload = body[RESPONSE_HEADER.size:]
+                if status == STATUS_OK:
+                    future.set_result(payload)
+                else:
+                    future.set_exception(ValueError(payload.decode('utf-8')))
+        except (ValueError, ConnectionError) as e:
+            error = e
+        for future in self._waiting.values():
+            if not future.done():
+                future.set_exception(error)
+        self._waiting.clear()
+
+    async def _request(self, operation, cipher_mode="ECB", key=0, iv=None, payload=b""):
+        if self._receiver.done():
+            raise ConnectionError("Connection closed by the server")
+        request_id = self._next_id
+        self._next_id = (self._next_id + 1) & 0xFFFFFFFF
+        future = self._waiting[request_id] = asyncio.get_running_loop().create_future()
+        self._writer.write(encode_request(request_id, operation, cipher_mode.upper(), key, iv, payload))
+        await self._writer.drain()
+        return await future
+
+    @staticmethod
+    def _key(key):
+        return key if isinstance(key, int) else mini_aes.hex_to_int(key)
+
+    async def encrypt(self, key, data, cipher_mode="ECB", iv=None):
+        """Encrypt bytes like MiniAES.*_bytes; key is a hex string or int, iv a 16-bit int or None."""
+        return await self._request(OP_ENCRYPT, cipher_mode, self._key(key), iv, data)
+
+    async def decrypt(self, key, data, cipher_mode="ECB"):
+        return await self._request(OP_DECRYPT, cipher_mode, self._key(key), None, data)
+
+    async def stats(self):
+        return json.loads(await self._request(OP_STATS))
+
+    async def close(self):
+        self._writer.close()
+        try:
+            await self._writer.wait_closed()
+        except ConnectionError:
+            pass
+        await self._receiver
+
+async def _serve(args):
+    server = BatchingServer(args.workers, args.window / 1e3, engine=args.engine)
+    await server.start(args.host, args.port, args.unix)
+    print(f"mini-aes server listening on {args.unix or f'{args.host}:{args.port}'}", file=sys.stderr, flush=True)
+    try:
+        while True:
+            await asyncio.sleep(args.stats_interval or 3600)
+            if args.stats_interval:
+                print(json.dumps(server.stats()), file=sys.stderr, flush=True)
+    finally:
+        await server.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mini-AES batching encryption server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", help="listen on this Unix socket path instead of TCP")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--window", type=float, default=BATCH_WINDOW * 1e3, help="batching window in milliseconds")
+    parser.add_argument("--engine", default=DEFAULT_ENGINE,
+                        choices=mini_aes.engine_names())
+    parser.add_argument("--stats-interval", type=float, default=0, help="print stats to stderr every N seconds")
+    args = parser.parse_args()
+    try:
+        asyncio.run(_serve(args))
+    except KeyboardInterrupt:
+        pass
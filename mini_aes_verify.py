@@ -0,0 +1,249 @@
+import argparse
+import json
+import os
+import random
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import zip_longest
+
+import mini_aes
+
+# Exhaustive verification over the whole (key, plaintext) space, 2^32 blocks.
+# The space is split into shards of consecutive keys; for every key of a shard
+# each engine under test encrypts all 65536 blocks, the result must match the
+# reference engine and decrypt back to the plaintexts. The reference engine
+# must round-trip all blocks as well. On a sample of blocks per key it is checked
+# against the traced encrypt()/decrypt() and against the reference matrix
+# functions (sub_nibbles/shift_rows/mix_columns/add_round_key on the 2x2 state,
+# round keys from key_expansion()), which share no code with the packed engines;
+# both are far too slow to run on every block.
+# Completed shards are written to a JSON checkpoint so a run can be resumed.
+
+KEY_SPACE = 1 << 16
+
+# keys per shard (each key covers all 65536 plaintexts)
+SHARD_KEYS = 64
+
+# blocks per key checked against the traced path and the matrix functions
+TRACE_SAMPLES = 4
+
+REFERENCE_ENGINE = mini_aes.PackedEngine.name
+
+_ALL_BLOCKS = array('H', range(KEY_SPACE))
+
+def available_engines():
+    """Engine names that load here; optional engines missing their dependency are left out."""
+    names = []
+    for name in mini_aes.engine_names():
+        try:
+            mini_aes.get_engine(name)
+        except ValueError:
+            continue
+        names.append(name)
+    return names
+
+def _first_mismatch(plaintexts, expected, got):
+    # (plaintext block, expected, got) at the first difference, or None
+    for plaintext, a, b in zip_longest(plaintexts, expected, got):
+        if a != b:
+            return plaintext, a, b
+    return None
+
+def _failure(check, engine, key, mismatch):
+    block, expected, got = mismatch
+    return {'check': check, 'engine': engine, 'key': key, 'block': block, 'expected': expected, 'got': got}
+
+def _traced_blocks(function, blocks, key_hex):
+    # blocks_to_hex byte-swaps its argument, so hand it a copy
+    text, error, _ = function(mini_aes.blocks_to_hex(array('H', blocks)), key_hex, trace=True)
+    return array('H') if error else mini_aes.blocks_from_buffer(mini_aes.hex_to_bytes(text))
+
+def _to_matrix(block):
+    return mini_aes.nibbles_to_matrix(mini_aes.hex_to_nibbles("{:04X}".format(block)))
+
+def _from_matrix(state):
+    return mini_aes.hex_to_int(mini_aes.matrix_to_hex(state))
+
+def _matrix_encrypt(block, round_keys):
+    # one block through the reference matrix functions
+    state = mini_aes.add_round_key(_to_matrix(block), round_keys[0])
+    for r in range(1, mini_aes.NUM_ROUNDS):
+        state = mini_aes.mix_columns(mini_aes.shift_rows(mini_aes.sub_nibbles(state, mini_aes.S_BOX)))
+        state = mini_aes.add_round_key(state, round_keys[r])
+    state = mini_aes.shift_rows(mini_aes.sub_nibbles(state, mini_aes.S_BOX))
+    return _from_matrix(mini_aes.add_round_key(state, round_keys[mini_aes.NUM_ROUNDS]))
+
+def _matrix_decrypt(block, round_keys):
+    state = mini_aes.add_round_key(_to_matrix(block), round_keys[mini_aes.NUM_ROUNDS])
+    state = mini_aes.sub_nibbles(mini_aes.shift_rows(state), mini_aes.INV_S_BOX)
+    for r in range(mini_aes.NUM_ROUNDS - 1, 0, -1):
+        state = mini_aes.add_round_key(state, round_keys[r])
+        state = mini_aes.mix_columns(state, mini_aes.INV_MIX_COL_MATRIX)
+        state = mini_aes.sub_nibbles(mini_aes.shift_rows(state), mini_aes.INV_S_BOX)
+    return _from_matrix(mini_aes.add_round_key(state, round_keys[0]))
+
+def _sample_blocks(key, count):
+    return array('H', random.Random(key).sample(range(KEY_SPACE), count))
+
+def _check_matrix(reference, key, trace_samples):
+    # key schedule and reference engine vs the matrix functions on a few blocks
+    round_keys = mini_aes.key_expansion(mini_aes.hex_to_nibbles("{:04X}".format(key)))[0]
+    failures = []
+    mismatch = _first_mismatch(range(len(round_keys)), [_from_matrix(rk) for rk in round_keys],
+                               mini_aes.get_key_schedule(key))
+    if mismatch:
+        failures.append(_failure('key_schedule', reference.name, key, mismatch))
+    blocks = _sample_blocks(key, trace_samples)
+    ciphertext = reference.encrypt_blocks(blocks)
+    mismatch = _first_mismatch(blocks, [_matrix_encrypt(block, round_keys) for block in blocks], ciphertext)
+    if mismatch:
+        failures.append(_failure('matrix_encrypt', reference.name, key, mismatch))
+    mismatch = _first_mismatch(blocks, blocks, [_matrix_decrypt(block, round_keys) for block in ciphertext])
+    if mismatch:
+        failures.append(_failure('matrix_decrypt', reference.name, key, mismatch))
+    return failures
+
+def _check_traced(reference, key, trace_samples):
+    # reference engine vs the traced implementation on a few blocks
+    blocks = _sample_blocks(key, trace_samples)
+    key_hex = "{:04X}".format(key)
+    ciphertext = reference.encrypt_blocks(blocks)
+    failures = []
+    mismatch = _first_mismatch(blocks, _traced_blocks(mini_aes.encrypt, blocks, key_hex), ciphertext)
+    if mismatch:
+        failures.append(_failure('traced_encrypt', reference.name, key, mismatch))
+    mismatch = _first_mismatch(blocks, blocks, _traced_blocks(mini_aes.decrypt, ciphertext, key_hex))
+    if mismatch:
+        failures.append(_failure('traced_decrypt', reference.name, key, mismatch))
+    return failures
+
+def verify_shard(shard, engines, reference=REFERENCE_ENGINE, shard_keys=SHARD_KEYS, trace_samples=TRACE_SAMPLES):
+    """
+    Verify keys [shard * shard_keys, (shard + 1) * shard_keys).
+    Returns (shard, blocks_checked, failures); failures are dicts naming the
+    check, engine, key and the first mismatching block.
+    """
+    failures = []
+    blocks_checked = 0
+    for key in range(shard * shard_keys, min((shard + 1) * shard_keys, KEY_SPACE)):
+        round_keys = mini_aes.get_key_schedule(key)
+        reference_engine = mini_aes.get_engine(reference)(round_keys)
+        expected = reference_engine.encrypt_blocks(_ALL_BLOCKS)
+        mismatch = _first_mismatch(_ALL_BLOCKS, _ALL_BLOCKS, reference_engine.decrypt_blocks(expected))
+        if mismatch:
+            failures.append(_failure('round_trip', reference, key, mismatch))
+        blocks_checked += KEY_SPACE
+        if trace_samples:
+            failures += _check_matrix(reference_engine, key, trace_samples)
+            failures += _check_traced(reference_engine, key, trace_samples)
+        for name in engines:
+            engine = mini_aes.get_engine(name)(round_keys)
+            ciphertext = engine.encrypt_blocks(_ALL_BLOCKS)
+            mismatch = _first_mismatch(_ALL_BLOCKS, expected, ciphertext)
+            if mismatch:
+                failures.append(_failure('encrypt', name, key, mismatch))
+            mismatch = _first_mismatch(_ALL_BLOCKS, _ALL_BLOCKS, engine.decrypt_blocks(ciphertext))
+            if mismatch:
+                failures.append(_failure('round_trip', name, key, mismatch))
+            blocks_checked += KEY_SPACE
+    return shard, blocks_checked, failures
+
+def _load_checkpoint(path, settings):
+    if not path or not os.path.exists(path):
+        return {'settings': settings, 'completed': [], 'blocks_checked': 0, 'seconds': 0.0, 'failures': []}
+    with open(path, 'r', encoding='utf-8') as f:
+        state = json.load(f)
+    if state['settings'] != settings:
+        raise ValueError(f"Checkpoint {path} was written with different settings: {state['settings']}")
+    return state
+
+def _save_checkpoint(path, state):
+    # write a temporary file and rename it, so an interrupted write never corrupts the checkpoint
+    temp_path = path + ".tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+    os.replace(temp_path, path)
+
+def verify(engines=None, reference=REFERENCE_ENGINE, start_key=0, stop_key=KEY_SPACE, shard_keys=SHARD_KEYS,
+           workers=None, checkpoint=None, trace_samples=TRACE_SAMPLES, progress=None):
+    """
+    Verify engines (default: every available engine except the reference) on all keys in
+    [start_key, stop_key), rounded out to whole shards, and all 65536 plaintexts.
+    workers processes run the shards (None means os.cpu_count(), 1 runs here).
+    checkpoint is a JSON file path; completed shards recorded there are skipped,
+    so rerunning the same call resumes an interrupted run.
+    progress, if given, is called as progress(shards_done, shards_total, blocks_per_second).
+    Returns a report dict: shards, blocks_checked, seconds, blocks_per_second, failures.
+    """
+    if shard_keys < 1:
+        raise ValueError("shard_keys must be at least 1")
+    if engines is None:
+        engines = [name for name in available_engines() if name != reference]
+    engines = list(engines)
+    for name in [reference] + engines:
+        mini_aes.get_engine(name) # unknown names fail before any work starts
+    shards = range(start_key // shard_keys, -(-min(stop_key, KEY_SPACE) // shard_keys))
+    settings = {'engines': engines, 'reference': reference, 'shard_keys': shard_keys, 'trace_samples': trace_samples}
+    state = _load_checkpoint(checkpoint, settings)
+    done = set(state['completed'])
+    pending = [shard for shard in shards if shard not in done]
+    workers = workers or os.cpu_count() or 1
+
+    started = last_record = time.perf_counter()
+    run_blocks = 0
+    def record(result):
+        nonlocal run_blocks, last_record
+        shard, blocks_checked, failures = result
+        now = time.perf_counter()
+        run_blocks += blocks_checked
+        state['completed'].append(shard)
+        state['blocks_checked'] += blocks_checked
+        state['failures'] += failures
+        state['seconds'] += now - last_record
+        last_record = now
+        if checkpoint:
+            _save_checkpoint(checkpoint, state)
+        if progress:
+            completed = set(state['completed'])
+            done = sum(1 for shard in shards if shard in completed)
+            progress(done, len(shards), run_blocks / (now - started) if now > started else 0.0)
+
+    args = (engines, reference, shard_keys, trace_samples)
+    if workers == 1:
+        for shard in pending:
+            record(verify_shard(shard, *args))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for future in as_completed([pool.submit(verify_shard, shard, *args) for shard in pending]):
+                record(future.result())
+    seconds = time.perf_counter() - started
+    return {
+        'shards': len(shards),
+        'blocks_checked': state['blocks_checked'],
+        'seconds': state['seconds'],
+        'blocks_per_second': run_blocks / seconds if seconds else 0.0,
+        'failures': state['failures'],
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Exhaustive Mini-AES engine verification")
+    parser.add_argument("--engines", nargs="*", help="engines to verify (default: all available but the reference)")
+    parser.add_argument("--reference", default=REFERENCE_ENGINE)
+    parser.add_argument("--start-key", type=lambda v: int(v, 16), default=0, help="first key (hex)")
+    parser.add_argument("--stop-key", type=lambda v: int(v, 16), default=KEY_SPACE, help="end of the key range (hex, exclusive)")
+    parser.add_argument("--shard-keys", type=int, default=SHARD_KEYS)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--checkpoint", default=None, help="JSON checkpoint file for resuming")
+    parser.add_argument("--trace-samples", type=int, default=TRACE_SAMPLES)
+    args = parser.parse_args()
+
+    def show_progress(done, total, blocks_per_second):
+        print(f"shard {done}/{total}  {blocks_per_second:,.0f} blocks/s", flush=True)
+
+    report = verify(args.engines, args.reference, args.start_key, args.stop_key, args.shard_keys,
+                    args.workers, args.checkpoint, args.trace_samples, show_progress)
+    print(f"Checked {report['blocks_checked']:,} blocks in {report['seconds']:.1f} s")
+    for failure in report['failures']:
+        print("FAIL {check} engine={engine} key={key:04X} block={block:04X} expected={expected} got={got}".format(**failure))
+    raise SystemExit(1 if report['failures'] else 0)